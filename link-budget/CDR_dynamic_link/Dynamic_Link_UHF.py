@@ -1,4 +1,3 @@
-import scipy.io
 import numpy as np
 # from Cython.Includes.numpy import ndarray
 from astropy import units as u
@@ -12,8 +11,11 @@ from linkbudget.transmitter import DownlinkTransmitter
 from linkbudget.spacecraft import Spacecraft
 from linkbudget.link import Downlink
 from linkbudget.utils import elevation_angle
+from linkbudget.ephemeris import read_gmat_report, PeriodicEphemeris
+from linkbudget.dynamic import DynamicLink
+from linkbudget.mat_cache import load_mat
+from linkbudget.eclipse import eclipse_mask
 from astropy.coordinates import EarthLocation
-import math
 import scipy.stats
 
 from mpl_toolkits import mplot3d
@@ -21,9 +23,6 @@ from mpl_toolkits import mplot3d
 # Advice to start the simulation after the first eclipse
 
 start = 45000
-sat_alt = []
-sat_long = []
-sat_lat = []
 gs_lat = 40.627233
 gs_long = 22.959887
 gs_alt = 56 * u.m
@@ -32,89 +31,29 @@ time_needed_to_point = 15000
 
 gs_coo = EarthLocation.from_geodetic(gs_long, gs_lat, gs_alt)
 coordinates_LTAN_11 = './simulation_files/F10D-CL-COORDINATES-11.txt'
-eclipse = scipy.io.loadmat('./simulation_files/eclipse11_6orb.mat')
-performance_error = scipy.io.loadmat('simulation_files/newboard.mat')
-ADCS_error_11 = np.array(performance_error['angles'])
-where_are_NaNs = np.isnan(ADCS_error_11)
-ADCS_error_11[where_are_NaNs] = 0
-ADCS_eclipse_11 = np.array(eclipse['eclipse'])
-where_are_NaNs = np.isnan(ADCS_error_11)
-ADCS_error_11[where_are_NaNs] = 0
+eclipse = load_mat('./simulation_files/eclipse11_6orb.mat')
+performance_error = load_mat('simulation_files/newboard.mat')
+# NaNs are already replaced by 0 in the cache
+ADCS_error_11 = performance_error['angles']
+ADCS_eclipse_11 = eclipse['eclipse']
 
 # Procedure to take only the non-eclipse timestamps from ADCS pointing
 
-j = 1
-A = ADCS_error_11[:, 0].size
-for time in ADCS_error_11:
-    if ADCS_eclipse_11[0, j - 1] == 1 and j < A - 15000 and ADCS_eclipse_11[0, j] == 0:
-        ADCS_eclipse_11[0, j:j + time_needed_to_point] = 3
-    j += 1
-eclipse = np.where(ADCS_eclipse_11[0, :] != 0)
-no_eclipse = np.where(ADCS_eclipse_11[0, :] == 0)
+no_eclipse, _ = eclipse_mask(ADCS_eclipse_11, time_needed_to_point)
 ADCS_error_no_eclipse = ADCS_error_11[no_eclipse, :]
-ADCS_error_no_eclipse_11 = ADCS_error_no_eclipse[0, start:, :]
+ADCS_error_no_eclipse_11 = ADCS_error_no_eclipse[start:, :]
 
 # Read the coordinates from GMAT file
 
-with open(coordinates_LTAN_11, 'r') as f:
-    for line in f:
-        if line.startswith("#") or line.startswith(" ") or line.startswith("\n"):
-            continue
-        else:
-            lines = line.strip("\n").split("   ")
-            try:
-                alt = lines[1]
-                if lines[4] == "":
-                    lat = lines[5]
-                else:
-                    lat = lines[4]
-                if lines[7].strip("  ") == "":
-                    long = lines[8]
-                else:
-                    long = lines[7]
-                sat_alt.append(float(alt))
-                sat_lat.append(float(lat))
-                sat_long.append(float(long))
-            except:
-                print(line)
-
-R = math.floor(len(ADCS_error_11) / len(sat_long))
-sat_alt = np.ndarray.flatten(np.array([sat_alt] * R))
-sat_lat = np.ndarray.flatten(np.array([sat_lat] * R))
-sat_long = np.ndarray.flatten(np.array([sat_long] * R))
-sat_alt = sat_alt + 70
-gain = np.genfromtxt('./simulation_files/farfield.txt')
-shape_ext = (181, 360)
-rad_pat = np.empty(shape_ext)
-theta_start = -90
-theta_end = 90
-theta_points = theta_end - theta_start + 1
-phi_start = -179
-phi_end = 180
-phi_points = phi_end - phi_start + 1
-
-d = 0
-z = 0
-theta_antenna = gain[:, 0]
-phi_antenna = gain[:, 1]
-gain_antenna = gain[:, 2]
-for i in enumerate(np.linspace(theta_start, theta_end, theta_points)):
-    for j in enumerate(np.linspace(phi_start, phi_end, phi_points)):
-        try:
-            a = int(theta_antenna[z])
-            b = int(phi_antenna[z])
-            rad_pat[a][b] = gain_antenna[z]
-            if (rad_pat[a][b] > -6):
-                d += 1
-        except:
-            print(z)
-        z += 1
-
-p = d / (180 * 361)
+report = read_gmat_report(coordinates_LTAN_11, ['epoch', 'altitude', 'latitude', 'longitude'])
+report['altitude'] = report['altitude'] + 70
+# The orbit is repeated over the whole ADCS record and interpolated to its 0.1 s rate, without copies
+ephemeris = PeriodicEphemeris(report, 0.1, len(ADCS_error_11))
+# Far-field pattern, parsed once and then loaded from the .npz cache
+sc_antenna = AntennaMeasured.from_farfield('./simulation_files/farfield.txt')
+p = np.mean(sc_antenna.rad_pattern > -6)
 print(p)
-G = np.max(rad_pat)
-sc_antenna = AntennaMeasured(rad_pat, 1, np.linspace(theta_start, theta_end, theta_points),
-                             np.linspace(phi_start, phi_end, phi_points))
+G = np.max(sc_antenna.rad_pattern)
 
 # Data for a three-dimensional line
 # y = np.linspace(-90, 90, 179, dtype = "int")
@@ -142,8 +81,6 @@ dlink = Downlink(ground_station, spacecraft, 437.5 * u.MHz, 20 * u.deg, 4.7 * cn
 
 theta_ADCS = ADCS_error_11[0:, 0]
 phi_ADCS = ADCS_error_11[0:, 1]
-dlink.elev_angle = []
-elev_angle = []
 
 x = [i * 0.1 for i in range(len(theta_ADCS))]
 plt.plot(x, theta_ADCS)
@@ -161,53 +98,13 @@ plt.grid(color='g', linestyle='--', linewidth=0.5)
 plt.show()
 
 
-for i in range(len(sat_long)):
-    # if i == 100000:
-    #     break
-    sat_coo = EarthLocation.from_geodetic(sat_long[i], sat_lat[i], (sat_alt[i] * 1000))
-    dlink.elev_angle = elevation_angle(sat_coo, gs_coo)
-    elev_angle.append(dlink.elev_angle.value)
-
-r_earth_v = np.array([r_earth] * len(elev_angle))
-ratio = np.divide(r_earth_v, (r_earth_v + sat_alt[0:len(elev_angle)]))
-elev_angle = [elev_angle[i] * math.pi / 180 for i in range(len(elev_angle))]
-arg = np.multiply(ratio, np.cos(elev_angle))
-theta_sc = np.arcsin(arg) * 180 / math.pi + np.array(theta_ADCS[0:len(arg)])
-
-indeces = [i for i in range(len(arg))]
-arg = np.delete(arg, indeces)
-ratio = np.delete(ratio, indeces)
-r_earth_v = np.delete(r_earth_v, indeces)
-elev_angle = np.delete(elev_angle, indeces)
-# ADCS_error_no_eclipse = np.delete(ADCS_error_no_eclipse, indeces)
-theta_ADCS = np.delete(theta_ADCS, indeces)
-
-i = 0
-link = []
-loss = []
-g = []
-d=0
-for errors in sat_lat:
-    try:
-        sat_coo = EarthLocation.from_geodetic(sat_long[i], sat_lat[i], (sat_alt[i] * 1000))
-    except:
-        print("Sat coo")
-    # if i == 100000:
-    #     break
-    if (theta_sc[i] > 90):
-        theta_sc[i] = 180 - theta_sc[i]
-    if (theta_sc[i] < -90):
-        theta_sc[i] = 180 + theta_sc[i]
-    spacecraft.sc_altitude = sat_alt[i] * u.km
-    dlink.elev_angle = elevation_angle(sat_coo, gs_coo)
-    g.append(sc_antenna.gain_p(theta_sc[i], phi_ADCS[i]))
-    loss.append((G - sc_antenna.gain_p(theta_sc[i], phi_ADCS[i])))
-    if(loss[i]>3):
-        d+=1
-    spacecraft.pointing_loss = loss[i] * cnv.dB
-    link.append(dlink.link_margin.value)
-    i += 1
-per=d/len(sat_alt)
+# Dynamic part of the link budget, evaluated in chunks and only while the satellite is above the horizon
+dynamic = DynamicLink(dlink, gs_coo, min_elevation=0, fold_theta=True)
+result = dynamic.run(ephemeris, ADCS_error_11[:, :2])
+link = result['link_margin']
+loss = result['pointing_loss']
+g = result['gain']
+per = np.mean(loss[~np.isnan(loss)] > 3)
 print(per)
 x = [i * 0.1 for i in range(len(link))]
 plt.plot(x, link)
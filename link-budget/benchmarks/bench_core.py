@@ -0,0 +1,201 @@
+"""
+Performance benchmarks of the core models
+
+Records the throughput (samples per second) and the peak memory of each benchmark at several sizes, and compares
+them with a stored baseline:
+
+    python benchmarks/bench_core.py --save          # store the baseline
+    python benchmarks/bench_core.py                 # compare against it
+
+Exits with status 1 if any benchmark is slower than the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from pycraf import conversions as cnv
+
+from linkbudget.antenna import Antenna, AntennaMeasured
+from linkbudget.ground_station import GroundStation
+from linkbudget.link import Downlink
+from linkbudget.receiver import DownlinkReceiver
+from linkbudget.spacecraft import Spacecraft
+from linkbudget.transmitter import DownlinkTransmitter
+from linkbudget.utils import slant_range, elevation_angle, geodetic_to_ecef
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+
+
+def _downlink():
+    gs_antenna = Antenna(12 * cnv.dB)
+    dtransmitter = DownlinkTransmitter(1.6 * u.W, 0 * cnv.dB, 4, 0 * cnv.dB, 0.5 * cnv.dB, 0.23 * cnv.dB)
+    dreceiver = DownlinkReceiver((0.023 + 0.0276 + 0.0276) * cnv.dB, 0.8 * cnv.dB, 1.1 * cnv.dB, 4, 154 * u.K,
+                                 289 * u.K, 28 * u.K,
+                                 22.5 * cnv.dB, 0.1 * cnv.dB, 1000 * u.K)
+    ground_station = GroundStation(gs_antenna, 0 * cnv.dB, dreceiver, dtransmitter, 56 * u.m)
+    spacecraft = Spacecraft(Antenna(0 * cnv.dB), 0 * cnv.dB, dtransmitter, dtransmitter, 500 * u.km)
+    return Downlink(ground_station, spacecraft, 437.5 * u.MHz, 20 * u.deg, 4.7 * cnv.dB,
+                    10000, 1e-6, 1 * cnv.dB, 7.2 * cnv.dB)
+
+
+def _pattern(n, shape=None):
+    """Pattern of (about) n grid points in degrees, on a square grid unless a (theta, phi) shape is specified"""
+    if shape is None:
+        k = max(int(np.sqrt(n)), 4)
+        shape = (k, k)
+    theta = np.linspace(-90, 90, shape[0])
+    phi = np.linspace(-180, 180, shape[1])
+    return np.cos(np.deg2rad(theta))[:, None] * (2 + np.sin(np.deg2rad(phi))), theta, phi
+
+
+# Each benchmark prepares its inputs for n samples and returns the function to time
+
+def bench_link_margin(n, rng):
+    dlink = _downlink()
+    elev_angle, sc_altitude, pointing_loss = rng.uniform(0, 90, n), rng.uniform(400, 600, n), rng.uniform(0, 3, n)
+    return lambda: dlink.link_margin_series(elev_angle, sc_altitude, pointing_loss)
+
+
+def bench_link_plan(n, rng):
+    plan = _downlink().compile()
+    elev_angle, sc_altitude, pointing_loss = rng.uniform(0, 90, n), rng.uniform(400, 600, n), rng.uniform(0, 3, n)
+    return lambda: plan.link_margin(elev_angle, sc_altitude, pointing_loss)
+
+
+def bench_slant_range(n, rng):
+    sc_altitude = rng.uniform(400, 600, n) * u.km
+    elev_angle = rng.uniform(0, 90, n) * u.deg
+    return lambda: slant_range(sc_altitude, 56 * u.m, elev_angle)
+
+
+def bench_elevation_angle(n, rng):
+    gs = EarthLocation.from_geodetic(22.959887, 40.627233, 56 * u.m)
+    sat = geodetic_to_ecef(rng.uniform(-180, 180, n), rng.uniform(-90, 90, n), 500000.)
+    return lambda: elevation_angle(sat, gs)
+
+
+def bench_geodetic_to_ecef(n, rng):
+    longitude, latitude, height = rng.uniform(-180, 180, n), rng.uniform(-90, 90, n), rng.uniform(4e5, 6e5, n)
+    return lambda: geodetic_to_ecef(longitude, latitude, height)
+
+
+def bench_antenna_construction(n, rng):
+    rad_pat, theta, phi = _pattern(n)
+    return lambda: AntennaMeasured(rad_pat, 1, theta, phi)
+
+
+def bench_gain_p(n, rng):
+    rad_pat, theta, phi = _pattern(181 * 361, (181, 361))
+    antenna = AntennaMeasured(rad_pat, 1, theta, phi)
+    t, p = rng.uniform(-90, 90, n), rng.uniform(-180, 180, n)
+    antenna.gain_p(0, 0)  # build the lookup engine outside the timed section
+    return lambda: antenna.gain_p(t, p)
+
+
+def bench_total_radiated_power(n, rng):
+    rad_pat, theta, phi = _pattern(n)
+    antenna = AntennaMeasured(rad_pat, 1, theta, phi)
+
+    def run():
+        # Reassigning the pattern invalidates the cached integral
+        antenna.rad_pattern = rad_pat
+        return antenna.total_radiated_power
+
+    return run
+
+
+BENCHMARKS = {
+    'link_margin': bench_link_margin,
+    'link_plan': bench_link_plan,
+    'slant_range': bench_slant_range,
+    'elevation_angle': bench_elevation_angle,
+    'geodetic_to_ecef': bench_geodetic_to_ecef,
+    'antenna_construction': bench_antenna_construction,
+    'gain_p': bench_gain_p,
+    'total_radiated_power': bench_total_radiated_power,
+}
+
+
+def measure(function, repeat):
+    """Best wall time (s) out of ``repeat`` runs and peak traced memory (bytes) of one run"""
+    function()  # warm-up
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(seconds), peak
+
+
+def run(names, sizes, repeat):
+    rng = np.random.default_rng(0)
+    results = {}
+    for name in names:
+        results[name] = {}
+        for n in sizes:
+            seconds, peak = measure(BENCHMARKS[name](n, rng), repeat)
+            results[name][str(n)] = {'seconds': seconds, 'throughput': n / seconds, 'peak_memory': peak}
+            print('{:<22} {:>10d} {:>14.4g} samples/s {:>10.1f} MiB'.format(name, n, n / seconds, peak / 2 ** 20))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Benchmarks whose throughput dropped by more than ``tolerance`` (relative) from the baseline"""
+    regressions = []
+    for name, sizes in results.items():
+        for n, result in sizes.items():
+            reference = baseline.get(name, {}).get(n)
+            if reference is None:
+                continue
+            change = result['throughput'] / reference['throughput'] - 1
+            print('{:<22} {:>10s} {:>+8.1%} throughput {:>+8.1%} peak memory'.format(
+                name, n, change, result['peak_memory'] / max(reference['peak_memory'], 1) - 1))
+            if change < -tolerance:
+                regressions.append((name, n, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('benchmarks', nargs='*', help='benchmarks to run (all if not specified): {}'.format(
+        ', '.join(BENCHMARKS)))
+    parser.add_argument('--sizes', type=lambda s: [int(float(n)) for n in s.split(',')], default=DEFAULT_SIZES,
+                        help='comma-separated numbers of samples, e.g. 1e3,1e5')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark (the best is kept)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative drop of throughput reported as a regression')
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: {}'.format(', '.join(sorted(unknown))))
+
+    results = run(args.benchmarks or list(BENCHMARKS), args.sizes, args.repeat)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}, run with --save to store one'.format(args.baseline))
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for name, n, change in regressions:
+        print('REGRESSION: {} at {} samples ({:+.1%})'.format(name, n, change))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
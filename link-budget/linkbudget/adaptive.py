@@ -0,0 +1,92 @@
+import numpy as np
+
+
+def adaptive_sample(evaluate, n, max_step=256, tolerances=None, thresholds=None, include=None):
+    """
+    Adaptive time-stepping over a series of n samples. The series is first evaluated every max_step samples, then
+    every interval is bisected until the linear interpolation between its ends predicts its midpoint within the
+    tolerances. Intervals are also refined down to single samples where the series appear or disappear (NaN edges,
+    e.g. AOS/LOS) and where they cross a threshold
+    :callable evaluate: takes an array of sample indices and returns a dict of arrays of the quantities at them
+    :int n: number of samples of the full-rate series
+    :int max_step: coarsest step (samples)
+    :dict tolerances: maximum interpolation error per quantity, e.g. {'link_margin': 0.1, 'pointing_loss': 0.1}
+    :dict thresholds: threshold(s) per quantity whose crossings must be resolved, e.g. {'link_margin': [0, 3]}
+    :~numpy.array include: sample indices that are always evaluated, e.g. around transients of the inputs that are
+                           shorter than max_step and could be stepped over
+    :return: sorted sample indices and dict of the quantities evaluated at them (empty for an empty series)
+    """
+    if n < 0:
+        raise ValueError("Negative number of samples {}".format(n))
+    if n == 0:
+        indices = np.arange(0)
+        return indices, evaluate(indices)
+    tolerances = tolerances or {}
+    thresholds = {key: np.atleast_1d(value) for key, value in (thresholds or {}).items()}
+
+    indices = np.unique(np.append(np.arange(0, n, max_step), n - 1))
+    if include is not None:
+        indices = np.union1d(indices, np.asarray(include, dtype=int))
+    values = evaluate(indices)
+    sampled = [(indices, values)]
+
+    left, right = indices[:-1], indices[1:]
+    left_values = {key: value[:-1] for key, value in values.items()}
+    right_values = {key: value[1:] for key, value in values.items()}
+    while left.size:
+        wide = right - left > 1
+        left, right = left[wide], right[wide]
+        left_values = {key: value[wide] for key, value in left_values.items()}
+        right_values = {key: value[wide] for key, value in right_values.items()}
+        if not left.size:
+            break
+
+        mid = (left + right) // 2
+        mid_values = evaluate(mid)
+        sampled.append((mid, mid_values))
+
+        fraction = (mid - left) / (right - left)
+        refine = np.zeros(mid.shape, dtype=bool)
+        for key in mid_values:
+            a, m, b = left_values[key], mid_values[key], right_values[key]
+            # Appearing or disappearing series (e.g. outside the contact windows)
+            refine |= (np.isnan(a) != np.isnan(m)) | (np.isnan(m) != np.isnan(b))
+            if key in tolerances:
+                with np.errstate(invalid='ignore'):
+                    refine |= np.abs(m - (a + (b - a) * fraction)) > tolerances[key]
+            for threshold in thresholds.get(key, ()):
+                above_a, above_m, above_b = a > threshold, m > threshold, b > threshold
+                refine |= (above_a != above_m) | (above_m != above_b)
+
+        # Split the intervals that failed into two halves, keep the others as they are
+        left = np.concatenate((left[refine], mid[refine]))
+        right = np.concatenate((mid[refine], right[refine]))
+        left_values = {key: np.concatenate((left_values[key][refine], mid_values[key][refine])) for key in mid_values}
+        right_values = {key: np.concatenate((mid_values[key][refine], right_values[key][refine]))
+                        for key in mid_values}
+
+    indices = np.concatenate([i for i, _ in sampled])
+    order = np.argsort(indices)
+    return indices[order], {key: np.concatenate([v[key] for _, v in sampled])[order] for key in values}
+
+
+def reconstruct(indices, values, n):
+    """
+    Full-rate series (n samples) from adaptively sampled quantities, by linear interpolation. Samples between a NaN
+    and a valid sample are NaN
+    :~numpy.array indices: sorted sample indices
+    :dict values: quantities at the sampled indices
+    :int n: number of samples of the full-rate series
+    """
+    samples = np.arange(n)
+    series = {}
+    for key, value in values.items():
+        value = np.asarray(value, dtype=float)
+        if not value.size:
+            series[key] = np.full(n, np.nan)
+            continue
+        invalid = np.isnan(value)
+        interpolated = np.interp(samples, indices, np.where(invalid, 0, value))
+        interpolated[np.interp(samples, indices, invalid.astype(float)) > 0] = np.nan
+        series[key] = interpolated
+    return series
@@ -1,8 +1,15 @@
+import hashlib
+import os
+import zipfile
+
 import numpy as np
 from astropy import units as u
 from pycraf import conversions as cnv
-from scipy.integrate import simps
-from scipy.interpolate import interp2d
+from scipy.integrate import simpson
+from scipy.ndimage import map_coordinates, spline_filter
+
+from linkbudget.stage_cache import file_digest
+from linkbudget.utils import replace_file
 
 
 class Antenna:
@@ -13,9 +20,84 @@ class Antenna:
     def antenna_gain(self):
         return self._antenna_gain
 
+    @antenna_gain.setter
+    def antenna_gain(self, antenna_gain):
+        self._antenna_gain = antenna_gain.to(cnv.dB)
+
+
+class PatternLookup:
+    def __init__(self, theta, phi, values, method='linear', phi_period=360.):
+        """
+        Batch lookup of a pattern sampled on a regular (theta, phi) grid. Any number of scattered (theta, phi) pairs
+        are evaluated in one call; phi wraps around its period and theta is clamped to the edges of the grid.
+        :~numpy.array theta: increasing theta angles of the grid rows
+        :~numpy.array phi: increasing phi angles of the grid columns
+        :~numpy.array values: 2D array of pattern values
+        :str method: interpolation method, 'linear' (bilinear) or 'cubic'
+        :float phi_period: period of phi, 360 for grids in degrees and 2 pi for grids in radians
+        """
+        if method not in ('linear', 'cubic'):
+            raise ValueError("Unknown interpolation method '{}', use 'linear' or 'cubic'".format(method))
+        self.method = method
+
+        theta = np.asarray(theta, dtype=float)
+        phi = np.asarray(phi, dtype=float)
+        values = np.asarray(values, dtype=float)
+
+        span = phi[-1] - phi[0]
+        self.phi_period = phi_period
+
+        # Wrap phi only if the grid covers the whole circle, i.e. the gap to the next period is at most one step
+        self.periodic = span >= phi_period - 1.5 * np.max(np.diff(phi))
+        self._phi0 = phi[0]
+        if self.periodic:
+            if np.isclose(span, phi_period):
+                # The last column repeats the first one
+                phi, values = phi[:-1], values[:, :-1]
+            # Pad with the wrapped-around columns, so that interpolation across the seam needs no special case.
+            # The cubic spline coefficients need a wider margin for the edge effects of the prefilter to die out
+            pad = 12 if method == 'cubic' else 1
+            phi = np.concatenate((phi[-pad:] - phi_period, phi, phi[:pad] + phi_period))
+            values = np.concatenate((values[:, -pad:], values, values[:, :pad]), axis=1)
+
+        self.theta = theta
+        self.phi = phi
+        self.values = values
+        if method == 'cubic':
+            self._coefficients = spline_filter(values, order=3, mode='nearest')
+
+    def __call__(self, theta, phi):
+        theta, phi = np.broadcast_arrays(np.asarray(theta, dtype=float), np.asarray(phi, dtype=float))
+        if self.periodic:
+            phi = self._phi0 + np.mod(phi - self._phi0, self.phi_period)
+
+        # Fractional grid indices (np.interp clamps the angles to the grid)
+        ti = np.interp(theta.ravel(), self.theta, np.arange(self.theta.size))
+        pj = np.interp(phi.ravel(), self.phi, np.arange(self.phi.size))
+
+        if self.method == 'cubic':
+            result = map_coordinates(self._coefficients, [ti, pj], order=3, mode='nearest', prefilter=False)
+        else:
+            # Non-finite angles (e.g. the NaNs outside the contact windows) give NaN rather than garbage indices
+            finite = np.isfinite(ti) & np.isfinite(pj)
+            ti, pj = np.where(finite, ti, 0), np.where(finite, pj, 0)
+            i = np.minimum(ti.astype(int), self.theta.size - 2)
+            j = np.minimum(pj.astype(int), self.phi.size - 2)
+            wt = ti - i
+            wp = pj - j
+            v = self.values
+            result = (1 - wt) * ((1 - wp) * v[i, j] + wp * v[i, j + 1]) + \
+                wt * ((1 - wp) * v[i + 1, j] + wp * v[i + 1, j + 1])
+            result[~finite] = np.nan
+        return result.reshape(theta.shape)
+
 
 class AntennaMeasured(Antenna):
-    def __init__(self, rad_pattern, antenna_e, rad_pattern_theta=None, rad_pattern_phi=None):
+    # Lazily computed values, not part of the contents of the antenna (see ~linkbudget.stage_cache.content_hash)
+    _transient = ('_total_radiated_power', '_rad_pattern_lookup')
+
+    def __init__(self, rad_pattern, antenna_e, rad_pattern_theta=None, rad_pattern_phi=None, interpolation='linear',
+                 angle_unit=None):
         """
         :~numpy.array rad_pattern: 2D array of antenna radiation intensity
          :float antenna_e: efficiency of antenna
@@ -23,55 +105,307 @@ class AntennaMeasured(Antenna):
                                          we assume the values to be equidistant (in the range [-pi/2, pi/2])
         :~numpy.array rad_pattern_phi: phi angles corresponding to the antenna gain values. If not specified,
                                          we assume the values to be equidistant (in the range [-pi, pi])
+        :str interpolation: interpolation of the pattern between grid points, 'linear' or 'cubic'
+        :str angle_unit: unit of the angles of the grid and of the lookups, 'deg' or 'rad'. If not specified, radians
+                         for the default grids and degrees for specified ones
         """
-        self.rad_pattern = rad_pattern
+        if angle_unit is None:
+            angle_unit = 'rad' if rad_pattern_theta is None and rad_pattern_phi is None else 'deg'
         self.antenna_e = antenna_e
+        self.interpolation = interpolation
+        self.angle_unit = angle_unit
+        self.rad_pattern = rad_pattern
 
         # Dimensions of radiation intensity measures
         n, k = self.rad_pattern.shape
+        half_turn = np.pi if angle_unit == 'rad' else 180.
 
         # if the theta aren't specified, we take the partition of [-pi/2, pi/2]
-        if not rad_pattern_theta.any():
-            self.rad_pattern_theta = np.array(np.linspace(-np.pi / 2, np.pi / 2, n))
+        if rad_pattern_theta is None:
+            self.rad_pattern_theta = np.array(np.linspace(-half_turn / 2, half_turn / 2, n))
         else:
             self.rad_pattern_theta = rad_pattern_theta
 
         # if the phi angles aren't specified, we take the partition of [-pi, pi]
-        if not rad_pattern_phi.any():
-            self.rad_pattern_phi = np.array(np.linspace(-np.pi, np.pi, k))
+        if rad_pattern_phi is None:
+            self.rad_pattern_phi = np.array(np.linspace(-half_turn, half_turn, k))
         else:
             self.rad_pattern_phi = rad_pattern_phi
 
-        # Interpolating spline
-        self.rad_pattern_spline = interp2d(self.rad_pattern_phi, self.rad_pattern_theta, self.rad_pattern)
-
         # There is currently no real need to call the constructor of the parent class
         super().__init__(self.gain)
 
+    @classmethod
+    def from_farfield(cls, path, antenna_e=1, columns=(0, 1, 2), fill=None, interpolation='linear', cache_dir=None,
+                      angle_unit='deg'):
+        """
+        Measured antenna from a far-field export (e.g. CST, HFSS) with one (theta, phi, value) row per grid point, in
+        any order. Header lines are skipped. The parsed grid is cached as .npz, keyed on the hash of the file
+        :str path: path to the export
+        :float antenna_e: efficiency of antenna
+        :tuple columns: columns of theta, phi and the pattern value
+        :float fill: value of the grid points missing from the export. If not specified, they raise a ValueError
+        :str interpolation: interpolation of the pattern between grid points, 'linear' or 'cubic'
+        :str cache_dir: directory of the cache (.cache next to the file if not specified)
+        :str angle_unit: unit of the angles of the export, 'deg' or 'rad'
+        """
+        def parse():
+            theta, phi, values = _read_columns(path, columns).T
+            theta_grid, i = np.unique(theta, return_inverse=True)
+            phi_grid, j = np.unique(phi, return_inverse=True)
+            grid = np.full((theta_grid.size, phi_grid.size), np.nan)
+            grid[i, j] = values
+            missing = np.isnan(grid)
+            if np.any(missing):
+                if fill is None:
+                    raise ValueError("{} misses {} points of the {} x {} grid".format(
+                        path, np.count_nonzero(missing), *grid.shape))
+                grid[missing] = fill
+            return {'theta': theta_grid, 'phi': phi_grid, 'values': grid}
+
+        grid = _load_cached(path, ('farfield', columns, fill), parse, cache_dir)
+        return cls(grid['values'], antenna_e, grid['theta'], grid['phi'], interpolation, angle_unit)
+
+    @classmethod
+    def from_grid(cls, path, shape, antenna_e=1, rad_pattern_theta=None, rad_pattern_phi=None, interpolation='linear',
+                  cache_dir=None, angle_unit=None):
+        """
+        Measured antenna from a text file of pattern values on a regular grid, in row-major (theta, phi) order. The
+        parsed grid is cached as .npz, keyed on the hash of the file
+        :str path: path to the file
+        :tuple shape: number of theta and phi angles of the grid
+        :float antenna_e: efficiency of antenna
+        :~numpy.array rad_pattern_theta: theta angles of the grid (see __init__)
+        :~numpy.array rad_pattern_phi: phi angles of the grid (see __init__)
+        :str interpolation: interpolation of the pattern between grid points, 'linear' or 'cubic'
+        :str cache_dir: directory of the cache (.cache next to the file if not specified)
+        :str angle_unit: unit of the angles, 'deg' or 'rad' (see __init__)
+        """
+        def parse():
+            values = np.loadtxt(path, ndmin=1).ravel()
+            if values.size != np.prod(shape):
+                raise ValueError("{} has {} values, a {} x {} grid needs {}".format(path, values.size, *shape,
+                                                                                     np.prod(shape)))
+            return {'values': values.reshape(shape)}
+
+        grid = _load_cached(path, ('grid', tuple(shape)), parse, cache_dir)
+        return cls(grid['values'], antenna_e, rad_pattern_theta, rad_pattern_phi, interpolation, angle_unit)
+
+    # The pattern and its angle grids are stored as read-only copies, so that the cached integrals and the
+    # interpolation engine can only go stale through the setters, which invalidate them
+
+    @property
+    def interpolation(self):
+        return self._interpolation
+
+    @interpolation.setter
+    def interpolation(self, interpolation):
+        self._interpolation = interpolation
+        self._rad_pattern_lookup = None
+
+    @property
+    def angle_unit(self):
+        return self._angle_unit
+
+    @angle_unit.setter
+    def angle_unit(self, angle_unit):
+        if angle_unit not in ('deg', 'rad'):
+            raise ValueError("Unknown angle unit '{}', use 'deg' or 'rad'".format(angle_unit))
+        self._angle_unit = angle_unit
+        self._rad_pattern_lookup = None
+
+    @property
+    def rad_pattern(self):
+        return self._rad_pattern
+
+    @rad_pattern.setter
+    def rad_pattern(self, rad_pattern):
+        self._rad_pattern = _read_only(rad_pattern)
+        self._invalidate()
+
+    @property
+    def rad_pattern_theta(self):
+        return self._rad_pattern_theta
+
+    @rad_pattern_theta.setter
+    def rad_pattern_theta(self, rad_pattern_theta):
+        self._rad_pattern_theta = _read_only(rad_pattern_theta)
+        self._invalidate()
+
+    @property
+    def rad_pattern_phi(self):
+        return self._rad_pattern_phi
+
+    @rad_pattern_phi.setter
+    def rad_pattern_phi(self, rad_pattern_phi):
+        self._rad_pattern_phi = _read_only(rad_pattern_phi)
+        self._invalidate()
+
+    def _invalidate(self):
+        self._total_radiated_power = None
+        self._rad_pattern_lookup = None
+
+    @property
+    def rad_pattern_lookup(self):
+        """Interpolation engine for batch lookups"""
+        if self._rad_pattern_lookup is None:
+            self._rad_pattern_lookup = PatternLookup(self.rad_pattern_theta, self.rad_pattern_phi, self.rad_pattern,
+                                                     self.interpolation,
+                                                     360. if self.angle_unit == 'deg' else 2 * np.pi)
+        return self._rad_pattern_lookup
+
     @property
     def total_radiated_power(self):
-        # Convert to polar coordinates
-        rad_pat_pol = (self.rad_pattern.T * np.sin(self.rad_pattern_theta)).T
-        # To find the total radiated power we calculate the double integral of the radiation intensity using
-        # Simpson's rule
-        total_rad_power = simps([simps(rad_pattern_th, self.rad_pattern_phi) for rad_pattern_th in rad_pat_pol],
-                                self.rad_pattern_theta)
-        return total_rad_power
+        if self._total_radiated_power is None:
+            # Convert to polar coordinates
+            rad_pat_pol = self.rad_pattern * np.sin(self.rad_pattern_theta)[:, np.newaxis]
+            # To find the total radiated power we calculate the double integral of the radiation intensity using
+            # Simpson's rule, one axis at a time
+            self._total_radiated_power = _simpson(_simpson(rad_pat_pol, self.rad_pattern_phi, axis=1),
+                                                  self.rad_pattern_theta)
+        return self._total_radiated_power
 
     @property
     def mean_radiation_intensity(self):
         return self.total_radiated_power / (4 * np.pi)
 
     def directivity(self, theta, phi):
-        return self.rad_pattern_spline(theta, phi)[0] / self.mean_radiation_intensity
+        return self.gain_p(theta, phi) / self.mean_radiation_intensity
 
     def gain_p(self, theta, phi):
-        return self.rad_pattern_spline(theta, phi)[0]
+        """Pattern value at (theta, phi); arrays of angles are evaluated element-wise in one call"""
+        gain = self.rad_pattern_lookup(theta, phi)
+        return gain if gain.ndim else gain.item()
 
     @property
     def gain(self):
         return (self.antenna_e * np.max(self.rad_pattern) / self.mean_radiation_intensity) * cnv.dB
 
+    # Pattern transformations return new antennas with the same efficiency and interpolation
+
+    def _with_pattern(self, rad_pattern, rad_pattern_theta, rad_pattern_phi):
+        return type(self)(rad_pattern, self.antenna_e, rad_pattern_theta, rad_pattern_phi, self.interpolation,
+                          self.angle_unit)
+
+    def mirror(self, axis='theta'):
+        """
+        Symmetric extension of the pattern about the first angle of an axis, e.g. a pattern measured for theta in
+        [0, 90] extended to [-90, 90]
+        :str axis: 'theta' or 'phi'
+        """
+        if axis not in ('theta', 'phi'):
+            raise ValueError("Unknown axis '{}', use 'theta' or 'phi'".format(axis))
+        angles = self.rad_pattern_theta if axis == 'theta' else self.rad_pattern_phi
+        angles = np.concatenate((2 * angles[0] - angles[:0:-1], angles))
+        if axis == 'theta':
+            rad_pattern = np.concatenate((self.rad_pattern[:0:-1], self.rad_pattern))
+            return self._with_pattern(rad_pattern, angles, self.rad_pattern_phi)
+        rad_pattern = np.concatenate((self.rad_pattern[:, :0:-1], self.rad_pattern), axis=1)
+        return self._with_pattern(rad_pattern, self.rad_pattern_theta, angles)
+
+    def resample(self, theta, phi):
+        """
+        Pattern interpolated to a new grid
+        :~numpy.array theta: theta angles of the new grid
+        :~numpy.array phi: phi angles of the new grid
+        """
+        theta = np.asarray(theta, dtype=float)
+        phi = np.asarray(phi, dtype=float)
+        return self._with_pattern(self.rad_pattern_lookup(theta[:, np.newaxis], phi[np.newaxis, :]), theta, phi)
+
+    def pad(self, theta, phi, floor):
+        """
+        Pattern on a wider grid, with a floor value outside the angles covered by the current one, e.g. a measured
+        hemisphere extended to the whole sphere
+        :~numpy.array theta: theta angles of the new grid
+        :~numpy.array phi: phi angles of the new grid
+        :float floor: value outside the current grid
+        """
+        padded = self.resample(theta, phi)
+        outside = ((padded.rad_pattern_theta < self.rad_pattern_theta[0]) |
+                   (padded.rad_pattern_theta > self.rad_pattern_theta[-1]))[:, np.newaxis]
+        if not self.rad_pattern_lookup.periodic:
+            outside = outside | ((padded.rad_pattern_phi < self.rad_pattern_phi[0]) |
+                                 (padded.rad_pattern_phi > self.rad_pattern_phi[-1]))[np.newaxis, :]
+        return self._with_pattern(np.where(outside, floor, padded.rad_pattern), padded.rad_pattern_theta,
+                                  padded.rad_pattern_phi)
+
+    def rotate(self, rotation):
+        """
+        Pattern in a rotated antenna frame, on the same grid. Theta is the angle from the boresight (z axis) and phi
+        the azimuth from the x axis. Directions that fall outside the grid take the values at its edges
+        :rotation: 3 x 3 rotation matrix or ~scipy.spatial.transform.Rotation, from the current to the new frame
+        """
+        matrix = rotation.as_matrix() if hasattr(rotation, 'as_matrix') else np.asarray(rotation, dtype=float)
+        scale = np.pi / 180 if self.angle_unit == 'deg' else 1.
+        theta = self.rad_pattern_theta[:, np.newaxis] * scale
+        phi = self.rad_pattern_phi[np.newaxis, :] * scale
+        direction = np.stack(np.broadcast_arrays(np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi),
+                                                 np.cos(theta)), axis=-1)
+        # The new pattern in a direction is the current one in the direction rotated back
+        x, y, z = np.moveaxis(direction @ matrix, -1, 0)
+        rad_pattern = self.rad_pattern_lookup(np.arccos(np.clip(z, -1, 1)) / scale, np.arctan2(y, x) / scale)
+        return self._with_pattern(rad_pattern, self.rad_pattern_theta, self.rad_pattern_phi)
+
+
+def _read_columns(path, columns):
+    """Numeric columns of a text file, skipping the header lines (column names, separators) at its top"""
+    with open(path) as f:
+        for header, line in enumerate(f):
+            try:
+                [float(token) for token in np.array(line.split())[list(columns)]]
+                break
+            except (ValueError, IndexError):
+                continue
+        else:
+            raise ValueError("{} has no rows of numeric columns {}".format(path, tuple(columns)))
+    return np.loadtxt(path, skiprows=header, usecols=columns, ndmin=2)
+
+
+def _load_cached(path, key, parse, cache_dir=None):
+    """
+    Arrays parsed from a file, cached as .npz under the hash of the file contents and of the parsing options
+    :str path: path to the file
+    :tuple key: parsing options
+    :callable parse: returns the dict of arrays parsed from the file
+    :str cache_dir: directory of the cache (.cache next to the file if not specified)
+    """
+    digest = hashlib.sha256((repr(key) + file_digest(path)).encode()).hexdigest()
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.cache') if cache_dir is None else cache_dir
+    cache = os.path.join(cache_dir, digest + '.npz')
+    try:
+        with np.load(cache) as arrays:
+            return dict(arrays)
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        # Missing or corrupt entry (e.g. truncated by a full disk): parsed again and replaced
+        pass
+
+    arrays = parse()
+    os.makedirs(cache_dir, exist_ok=True)
+    replace_file(cache, lambda f: np.savez(f, **arrays))
+    return arrays
+
+
+def _read_only(array):
+    """Read-only copy of an array, which the caller can't modify through the original either"""
+    array = np.array(array)
+    array.flags.writeable = False
+    return array
+
+
+def _simpson(y, x, axis=-1):
+    """
+    Simpson's rule along an axis. An even number of samples takes the average of the rule applied to the first and
+    to the last N - 1 samples, with the trapezoidal rule on the remaining interval (scipy's former even='avg')
+    """
+    y = np.moveaxis(np.asarray(y, dtype=float), axis, -1)
+    x = np.asarray(x, dtype=float)
+    if y.shape[-1] % 2:
+        return simpson(y, x=x, axis=-1)
+    first = simpson(y[..., :-1], x=x[:-1], axis=-1) + (x[-1] - x[-2]) * (y[..., -1] + y[..., -2]) / 2
+    last = simpson(y[..., 1:], x=x[1:], axis=-1) + (x[1] - x[0]) * (y[..., 0] + y[..., 1]) / 2
+    return (first + last) / 2
+
 
 # TODO: Currently only axial-mode is supported
 class AntennaHelical(Antenna):
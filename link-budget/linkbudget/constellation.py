@@ -0,0 +1,76 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from linkbudget.ephemeris import read_gmat_report
+from linkbudget.network import GroundStationNetwork
+
+
+class Constellation:
+    def __init__(self, spacecraft, chunk_size=100000, min_elevation=0., keys=('elev_angle', 'link_margin'),
+                 max_workers=None):
+        """
+        Batch evaluation of M spacecraft over N ground stations. Every spacecraft is a shard, evaluated by a worker
+        process against all stations at once (see ~linkbudget.network.GroundStationNetwork)
+        :dict spacecraft: (stations, ephemeris, attitude) of every spacecraft, keyed on its name. stations maps the
+                          station names, the same for every spacecraft, to (link, location) pairs with the links of
+                          that spacecraft. ephemeris is a dict of ephemeris arrays, a
+                          ~linkbudget.ephemeris.PeriodicEphemeris or the path to a GMAT report (read by the worker),
+                          and attitude an array of attitude errors (theta, phi) in deg, or None
+        :int chunk_size: number of samples per chunk
+        :float min_elevation: elevation mask (deg)
+        :tuple keys: result quantities to collect (see ~linkbudget.network.GroundStationNetwork.process)
+        :int max_workers: number of worker processes. 1 evaluates in this process, None uses one process per CPU
+        """
+        self.spacecraft = dict(spacecraft)
+        self.names = list(self.spacecraft)
+        stations = [list(members[0]) for members in self.spacecraft.values()]
+        if any(names != stations[0] for names in stations):
+            raise ValueError("Every spacecraft must be evaluated over the same stations")
+        self.stations = stations[0] if stations else []
+        self.chunk_size = chunk_size
+        self.min_elevation = min_elevation
+        self.keys = tuple(keys)
+        self.max_workers = max_workers
+
+    def run(self):
+        """
+        :return: dict of M x N x T arrays (spacecraft x stations x samples) of the collected quantities, NaN past the
+                 end of shorter ephemerides, and the 'visible' tensor of the samples above the elevation mask
+        """
+        tasks = [(stations, ephemeris, attitude, self.chunk_size, self.min_elevation, self.keys)
+                 for stations, ephemeris, attitude in self.spacecraft.values()]
+        if self.max_workers == 1:
+            shards = [_evaluate_spacecraft(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(self.max_workers) as executor:
+                shards = list(executor.map(_evaluate_spacecraft, *zip(*tasks)))
+
+        length = max((len(shard['elev_angle']) for shard in shards), default=0)
+        result = {}
+        for key in ('elev_angle',) + tuple(key for key in self.keys if key != 'elev_angle'):
+            tensor = np.full((len(shards), len(self.stations), length), np.nan)
+            for i, shard in enumerate(shards):
+                tensor[i, :, :len(shard[key])] = shard[key].T
+            result[key] = tensor
+        with np.errstate(invalid='ignore'):
+            result['visible'] = result['elev_angle'] >= self.min_elevation
+        if 'elev_angle' not in self.keys:
+            del result['elev_angle']
+        return result
+
+
+def _evaluate_spacecraft(stations, ephemeris, attitude, chunk_size, min_elevation, keys):
+    """Samples x stations results of one spacecraft, restricted to the requested quantities and the elevation"""
+    if isinstance(ephemeris, str):
+        ephemeris = read_gmat_report(ephemeris, ['altitude', 'latitude', 'longitude'])
+    shard = {}
+
+    def sink(result):
+        for key in set(keys) | {'elev_angle'}:
+            shard.setdefault(key, []).append(result[key])
+
+    GroundStationNetwork(stations, chunk_size, min_elevation).run(ephemeris, attitude, sink)
+    if not shard:
+        return {key: np.empty((0, len(stations))) for key in set(keys) | {'elev_angle'}}
+    return {key: np.concatenate(value) for key, value in shard.items()}
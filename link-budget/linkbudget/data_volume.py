@@ -0,0 +1,69 @@
+import numpy as np
+
+from linkbudget.utils import mask_intervals
+
+SECONDS_PER_DAY = 86400.
+
+
+def achievable_rate(link_margin, bit_rate, rates=None, min_margin=0.):
+    """
+    Bit rate of every sample. The margin scales with the bit rate as -10 log10(rate / bit_rate), so the highest rate
+    that keeps the margin at min_margin is chosen among the available rates
+    :~numpy.array link_margin: link margins (dB) at bit_rate, NaN outside the contact windows
+    :float bit_rate: bit rate at which the margins were computed (bps), i.e. the ``ber`` of the link
+    :list rates: available bit rates (bps). If not specified, the link runs at bit_rate whenever the margin allows
+    :float min_margin: margin kept at the selected rate (dB)
+    :return: array of bit rates (bps), 0 where no rate closes the link
+    """
+    link_margin = np.asarray(link_margin, dtype=float)
+    rates = np.sort(np.atleast_1d(np.asarray(bit_rate if rates is None else rates, dtype=float)))
+    # Margin at bit_rate that every rate needs
+    required = min_margin + 10 * np.log10(rates / bit_rate)
+    with np.errstate(invalid='ignore'):
+        feasible = np.searchsorted(required, link_margin, side='right')
+    rate = np.concatenate(([0.], rates))[feasible]
+    rate[np.isnan(link_margin)] = 0.
+    return rate
+
+
+def pass_data_volume(link_margin, step, bit_rate, rates=None, min_margin=0., passes=None):
+    """
+    Data volume of every pass of a run, at a fixed or adaptive bit rate (see achievable_rate)
+    :~numpy.array link_margin: link margins (dB) at bit_rate, NaN outside the contact windows
+    :float step: time between samples (s)
+    :float bit_rate: bit rate at which the margins were computed (bps), i.e. the ``ber`` of the link
+    :list rates: available bit rates (bps). If not specified, the link runs at bit_rate whenever the margin allows
+    :float min_margin: margin kept at the selected rate (dB)
+    :dict passes: 'aos' and 'los' ([start, stop) sample indices) of the passes, e.g. from
+                  ~linkbudget.passes.find_passes. If not specified, passes are the runs of samples with a margin
+    :return: dict of arrays, one entry per pass: 'aos', 'los', 'volume' (bits), 'duration' (s with a usable rate)
+             and 'mean_rate' (bps over the usable time)
+    """
+    rate = achievable_rate(link_margin, bit_rate, rates, min_margin)
+    if passes is None:
+        intervals = mask_intervals(~np.isnan(np.asarray(link_margin, dtype=float)))
+        aos, los = intervals[:, 0], intervals[:, 1]
+    else:
+        aos, los = np.asarray(passes['aos'], dtype=int), np.asarray(passes['los'], dtype=int)
+
+    # Sums over [aos, los) of every pass from the cumulative sums
+    volume = np.concatenate(([0.], np.cumsum(rate * step)))
+    usable = np.concatenate(([0], np.cumsum(rate > 0)))
+    pass_volume = volume[los] - volume[aos]
+    duration = (usable[los] - usable[aos]) * step
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_rate = np.where(duration > 0, pass_volume / duration, 0.)
+    return {'aos': aos, 'los': los, 'volume': pass_volume, 'duration': duration, 'mean_rate': mean_rate}
+
+
+def daily_data_volume(rate, step, offset=0.):
+    """
+    Data volume per day
+    :~numpy.array rate: bit rate of every sample (bps), see achievable_rate
+    :float step: time between samples (s)
+    :float offset: time of the first sample since the start of the first day (s)
+    :return: array of data volumes (bits), one per day
+    """
+    rate = np.asarray(rate, dtype=float)
+    day = ((offset + np.arange(rate.size) * step) // SECONDS_PER_DAY).astype(int)
+    return np.bincount(day, weights=rate * step)
@@ -0,0 +1,96 @@
+import numpy as np
+from astropy import units as u
+
+from linkbudget.link import Uplink
+
+
+def parameter_aliases(link):
+    """Short names of the usual trade parameters of a link, mapped to their attribute paths"""
+    transmitter = 'ground_station.gs_transmitter' if isinstance(link, Uplink) else 'spacecraft.sc_transmitter'
+    return {
+        'frequency': 'freq',
+        'power': transmitter + '.power_output',
+        'gs_antenna_gain': 'ground_station.gs_antenna.antenna_gain',
+        'bit_rate': 'ber',
+        'elevation': 'elev_angle',
+    }
+
+
+class DesignSpace:
+    def __init__(self, link, axes, chunk_size=1000000):
+        """
+        N-D cube of link margins over a grid of design parameters. Every axis is broadcast through the budget of the
+        link along its own dimension, so no object is built per point. The cube is evaluated lazily: indexing it
+        (e.g. space[:, 2]) only evaluates the selected points, and chunks() walks it in blocks of bounded size
+        :~linkbudget.link.Link link: nominal link
+        :dict axes: values of every axis, in order, keyed on a short name (see parameter_aliases: 'frequency',
+                    'power', 'gs_antenna_gain', 'bit_rate', 'elevation') or on an attribute path from the link
+                    (see ~linkbudget.link.Link.with_parameters). Plain arrays are taken in the unit of the parameter
+        :int chunk_size: maximum number of points per chunk
+        """
+        if not axes:
+            raise ValueError("A design space needs at least one axis")
+        aliases = parameter_aliases(link)
+        self.link = link
+        self.dims = tuple(axes)
+        self.coords = {name: values if isinstance(values, u.Quantity) else np.asarray(values)
+                       for name, values in axes.items()}
+        self.paths = {name: aliases.get(name, name) for name in self.dims}
+        self.chunk_size = chunk_size
+        # Fail early on unknown parameters
+        link.with_parameters({self.paths[name]: values[:1] for name, values in self.coords.items()})
+
+    @property
+    def shape(self):
+        return tuple(len(self.coords[name]) for name in self.dims)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __getitem__(self, key):
+        """Link margins (dB) of a sub-cube, selected per axis with integers, slices or index arrays"""
+        key = key if isinstance(key, tuple) else (key,)
+        if len(key) > len(self.dims):
+            raise IndexError("Too many indices for a {}-dimensional design space".format(len(self.dims)))
+        key = key + (slice(None),) * (len(self.dims) - len(key))
+
+        selected = [self.coords[name][index] for name, index in zip(self.dims, key)]
+        kept = [values.ndim for values in selected]
+        shape = tuple(len(values) for values in selected if values.ndim)
+        parameters = {}
+        axis = 0
+        for name, values, ndim in zip(self.dims, selected, kept):
+            if ndim:
+                # Own dimension of the sub-cube, broadcast against the others
+                values = values.reshape((1,) * axis + (-1,) + (1,) * (len(shape) - axis - 1))
+                axis += 1
+            parameters[self.paths[name]] = values
+        link_margin = self.link.with_parameters(parameters).link_margin.value
+        return np.array(np.broadcast_to(link_margin, shape), dtype=float)
+
+    def chunks(self):
+        """
+        Walk the cube in blocks of at most chunk_size points (or one row of the last axis, if larger)
+        :return: generator of (index, block) pairs, index being the tuple of integers and slices of the block
+        """
+        shape = self.shape
+        # Leading axes are iterated one index at a time, the next one is split in blocks that fit the chunk size
+        split = 0
+        while split < len(shape) - 1 and np.prod(shape[split + 1:]) > self.chunk_size:
+            split += 1
+        block = max(1, self.chunk_size // int(np.prod(shape[split + 1:])))
+        for outer in np.ndindex(*shape[:split]):
+            for start in range(0, shape[split], block):
+                index = outer + (slice(start, min(start + block, shape[split])),)
+                yield index, self[index]
+
+    def margin(self, out=None):
+        """
+        The whole cube of link margins (dB), evaluated chunk by chunk
+        :~numpy.array out: array of the shape of the cube to fill, e.g. a ~numpy.memmap for cubes larger than memory
+        """
+        out = np.empty(self.shape) if out is None else out
+        for index, block in self.chunks():
+            out[index] = block
+        return out
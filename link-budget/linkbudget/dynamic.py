@@ -0,0 +1,263 @@
+from collections.abc import Mapping
+
+from functools import partial
+
+import numpy as np
+from astropy import units as u
+
+from linkbudget.adaptive import adaptive_sample
+from linkbudget.antenna import AntennaMeasured
+from linkbudget.profiling import stage
+from linkbudget.utils import elevation_angle, geodetic_to_ecef, ecef_position
+
+R_EARTH = 6378.136  # Earth's radius (km), as in slant_range
+
+
+def off_nadir_angle(elev_angle, sc_altitude):
+    """
+    Angle between nadir and the line of sight to the ground station, as seen from the spacecraft (assuming
+    spherical Earth)
+    :~numpy.array elev_angle: elevation angles of the spacecraft (deg)
+    :~numpy.array sc_altitude: spacecraft altitudes (km)
+    """
+    return np.rad2deg(np.arcsin(R_EARTH / (R_EARTH + sc_altitude) * np.cos(np.deg2rad(elev_angle))))
+
+
+class DynamicLink:
+    def __init__(self, link, gs_location, chunk_size=100000, min_elevation=None, cache=None, fold_theta=False):
+        """
+        Dynamic link budget: ephemeris -> geometry -> attitude error -> antenna gain -> link margin, evaluated in
+        fixed-size chunks of samples
+        :~linkbudget.link.Link link: link to evaluate. The pattern of the spacecraft antenna (if measured) gives the
+                                     pointing loss
+        :~astropy.coordinates.EarthLocation gs_location: location of the ground station
+        :int chunk_size: number of samples per chunk
+        :float min_elevation: elevation mask (deg). If specified, the attitude, gain and margin stages only run inside
+                              the contact windows, and samples outside them are NaN
+        :~linkbudget.stage_cache.StageCache cache: on-disk cache of the stage outputs
+        :bool fold_theta: fold the theta angles beyond +-90 deg back into the pattern (theta > 90 -> 180 - theta,
+                          theta < -90 -> 180 + theta), as the UHF dynamic link script does for its [-90, 90] pattern.
+                          Otherwise they are clamped to the edges of the pattern grid
+        """
+        self.link = link
+        self.gs_location = gs_location
+        self.chunk_size = chunk_size
+        self.min_elevation = min_elevation
+        self.cache = cache
+        self.fold_theta = fold_theta
+
+    @property
+    def sc_antenna(self):
+        return self.link.spacecraft.sc_antenna
+
+    def geometry(self, altitude, latitude, longitude):
+        """Elevation angle (deg) of the spacecraft; altitude in km, latitude and longitude in deg"""
+        with stage('geometry', np.size(altitude)):
+            sat = geodetic_to_ecef(longitude, latitude, np.asarray(altitude) * 1000)
+            return elevation_angle(sat, ecef_position(self.gs_location)).to_value(u.deg)
+
+    def attitude(self, elev_angle, altitude, theta_error=0., phi_error=0.):
+        """Direction (theta, phi) of the ground station in the antenna frame (deg), including the attitude error"""
+        with stage('attitude', np.size(elev_angle)):
+            theta = off_nadir_angle(elev_angle, altitude) + theta_error
+            if self.fold_theta:
+                theta = np.where(theta > 90, 180 - theta, np.where(theta < -90, 180 + theta, theta))
+            phi = np.broadcast_to(phi_error, theta.shape)
+            return theta, phi
+
+    def gain(self, theta, phi):
+        """
+        Antenna gain towards the ground station and the corresponding pointing loss (dB)
+        :~numpy.array theta: theta angles of the direction of the ground station (deg)
+        :~numpy.array phi: phi angles of the direction of the ground station (deg)
+        """
+        with stage('gain', np.size(theta)):
+            if not isinstance(self.sc_antenna, AntennaMeasured):
+                gain = np.broadcast_to(self.sc_antenna.antenna_gain.value, np.shape(theta))
+                return gain, np.zeros(np.shape(theta))
+            if self.sc_antenna.angle_unit == 'rad':
+                # The pipeline works in degrees, the pattern is looked up in the unit of its grid
+                theta, phi = np.deg2rad(theta), np.deg2rad(phi)
+            gain = self.sc_antenna.gain_p(theta, phi)
+            return gain, np.max(self.sc_antenna.rad_pattern) - gain
+
+    def margin(self, elev_angle, altitude, pointing_loss, plan=None):
+        """
+        Link margin (dB), through the compiled float plan of the link
+        :~linkbudget.link.LinkPlan plan: compiled plan of the link (compiled here if not specified)
+        """
+        if plan is None:
+            plan = self.link.compile()
+        with stage('margin', np.size(elev_angle)):
+            return plan.link_margin(elev_angle, altitude, pointing_loss)
+
+    def process(self, block, attitude=None, plan=None):
+        """
+        Run all stages on one chunk. With a cache, every stage (geometry, pointing, margin) is looked up under the hash
+        of its inputs and only the stages whose inputs changed are computed
+        :dict block: ephemeris with 'altitude' (km), 'latitude' and 'longitude' (deg) arrays
+        :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg
+        :~linkbudget.link.LinkPlan plan: compiled plan of the link (compiled here if not specified)
+        :return: dict of 'elev_angle', 'theta', 'phi', 'gain', 'pointing_loss' and 'link_margin' arrays
+        """
+        with stage('chunk', np.size(block['altitude'])):
+            return self._process(block, attitude, plan)
+
+    def _process(self, block, attitude, plan):
+        altitude = np.asarray(block['altitude'], dtype=float)
+        latitude = np.asarray(block['latitude'], dtype=float)
+        longitude = np.asarray(block['longitude'], dtype=float)
+        geometry_key, geometry = self._stage(
+            lambda: {'elev_angle': self.geometry(altitude, latitude, longitude)},
+            'geometry', self.gs_location, altitude, latitude, longitude)
+        elev_angle = geometry['elev_angle']
+
+        # Only evaluate the samples inside the contact windows
+        visible = np.ones(elev_angle.shape, dtype=bool) if self.min_elevation is None else \
+            elev_angle >= self.min_elevation
+
+        def pointing():
+            stages = self._pointing_stages(elev_angle[visible], altitude[visible],
+                                           None if attitude is None else attitude[visible])
+            return {key: _expand(visible, value) for key, value in stages.items()}
+
+        pointing_key, pointing = self._stage(pointing, 'pointing', geometry_key, attitude, self.sc_antenna,
+                                             self.min_elevation, self.fold_theta)
+
+        def margin():
+            margin = self.margin(elev_angle[visible], altitude[visible], pointing['pointing_loss'][visible], plan)
+            return {'link_margin': _expand(visible, margin)}
+
+        _, margin = self._stage(margin, 'margin', pointing_key, self.link)
+        return dict(elev_angle=elev_angle, **pointing, **margin)
+
+    def _stage(self, compute, *inputs):
+        """Key and output of a stage, from the cache if there is one"""
+        if self.cache is None:
+            return None, compute()
+        key = self.cache.key(*inputs)
+        return key, self.cache.get_or_compute(key, compute)
+
+    def _pointing_stages(self, elev_angle, altitude, attitude):
+        if attitude is None:
+            theta, phi = self.attitude(elev_angle, altitude)
+        else:
+            theta, phi = self.attitude(elev_angle, altitude, attitude[:, 0], attitude[:, 1])
+        gain, pointing_loss = self.gain(theta, phi)
+        return {'theta': theta, 'phi': phi, 'gain': gain, 'pointing_loss': pointing_loss}
+
+    def link_stages(self, elev_angle, altitude, attitude, plan=None):
+        """
+        Attitude, gain and margin stages on samples whose elevation is already known, e.g. the samples in contact
+        with one station of a ~linkbudget.network.GroundStationNetwork
+        :~numpy.array elev_angle: elevation angles of the spacecraft (deg)
+        :~numpy.array altitude: spacecraft altitudes (km)
+        :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg
+        :~linkbudget.link.LinkPlan plan: compiled plan of the link (compiled here if not specified)
+        :return: dict of 'theta', 'phi', 'gain', 'pointing_loss' and 'link_margin' arrays
+        """
+        def compute():
+            stages = self._pointing_stages(elev_angle, altitude, attitude)
+            stages['link_margin'] = self.margin(elev_angle, altitude, stages['pointing_loss'], plan)
+            return stages
+
+        _, stages = self._stage(compute, 'link', elev_angle, altitude, attitude, self.sc_antenna, self.fold_theta,
+                                self.link)
+        return stages
+
+    def run(self, ephemeris, attitude=None, sink=None):
+        """
+        Run the pipeline over a whole simulation
+        :ephemeris: dict of ephemeris arrays (see process), a ~linkbudget.ephemeris.PeriodicEphemeris, or an
+                    iterable of blocks, e.g. from ~linkbudget.ephemeris.iter_gmat_report
+        :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg, aligned with the ephemeris samples
+        :callable sink: called with the results of every chunk. If not specified, the results are concatenated and
+                        returned
+        """
+        # The link is compiled once for the whole run
+        process = partial(self.process, plan=self.link.compile())
+        return run_chunks(process, self._chunks(ephemeris), attitude, sink)
+
+    def run_adaptive(self, ephemeris, attitude=None, max_step=256, margin_tolerance=0.1, pointing_tolerance=0.1,
+                     margin_thresholds=(), attitude_step=0.5):
+        """
+        Run the pipeline on adaptively chosen samples: coarse steps where geometry and attitude change slowly, single
+        samples around AOS/LOS (the elevation crossing min_elevation, or the horizon without an elevation mask),
+        margin threshold crossings and fast attitude transients
+        (see ~linkbudget.adaptive.adaptive_sample)
+        :dict ephemeris: dict of ephemeris arrays (see process) or a ~linkbudget.ephemeris.PeriodicEphemeris
+        :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg, aligned with the ephemeris samples
+        :int max_step: coarsest step (samples)
+        :float margin_tolerance: error bound of the link margin interpolated between samples (dB)
+        :float pointing_tolerance: error bound of the pointing loss interpolated between samples (dB)
+        :list margin_thresholds: link margins (dB) whose crossings are resolved to the sample
+        :float attitude_step: change of the attitude error between consecutive samples (deg) above which both
+                              samples are always evaluated, so that short transients aren't stepped over
+        :return: sorted sample indices and dict of the results at them. ~linkbudget.adaptive.reconstruct gives back
+                 the full-rate series
+        """
+        plan = self.link.compile()
+
+        def evaluate(indices):
+            block = {key: value[indices] for key, value in ephemeris.items()}
+            return self.process(block, None if attitude is None else attitude[indices], plan)
+
+        include = None
+        if attitude is not None:
+            # The attitude errors are known at full rate, so their transients can be found without running the stages
+            transients = np.flatnonzero(np.any(np.abs(np.diff(attitude[:, :2], axis=0)) > attitude_step, axis=1))
+            include = np.concatenate((transients, transients + 1))
+
+        return adaptive_sample(evaluate, len(ephemeris['altitude']), max_step,
+                               {'link_margin': margin_tolerance, 'pointing_loss': pointing_tolerance},
+                               {'link_margin': margin_thresholds,
+                                'elev_angle': 0. if self.min_elevation is None else self.min_elevation}, include)
+
+    def _chunks(self, ephemeris):
+        return iter_chunks(ephemeris, self.chunk_size)
+
+
+def _expand(mask, values):
+    """Full-length array with the values at the masked samples and NaN elsewhere"""
+    result = np.full(mask.shape, np.nan)
+    result[mask] = values
+    return result
+
+
+def iter_chunks(ephemeris, chunk_size):
+    """
+    Blocks of an ephemeris mapping of chunk_size samples, or the blocks of an iterable of them as they are
+    :ephemeris: dict of ephemeris arrays, a ~linkbudget.ephemeris.PeriodicEphemeris, or an iterable of blocks
+    :int chunk_size: number of samples per block
+    """
+    if not isinstance(ephemeris, Mapping):
+        yield from ephemeris
+        return
+    n = len(ephemeris['altitude'])
+    for start in range(0, n, chunk_size):
+        yield {key: value[start:start + chunk_size] for key, value in ephemeris.items()}
+
+
+def run_chunks(process, chunks, attitude=None, sink=None):
+    """
+    Run process(block, attitude) on every block, with the matching rows of the attitude errors
+    :callable process: evaluates one block, e.g. ~linkbudget.dynamic.DynamicLink.process
+    :chunks: iterable of ephemeris blocks (see iter_chunks)
+    :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg, aligned with the ephemeris samples
+    :callable sink: called with the results of every block. If not specified, the results are concatenated and
+                    returned
+    """
+    results = []
+    start = 0
+    for block in chunks:
+        n = len(block['altitude'])
+        if attitude is not None and start + n > len(attitude):
+            raise ValueError("Attitude errors cover {} samples, the ephemeris is longer".format(len(attitude)))
+        result = process(block, None if attitude is None else attitude[start:start + n])
+        start += n
+        if sink is None:
+            results.append(result)
+        else:
+            sink(result)
+    if sink is None:
+        return {key: np.concatenate([result[key] for result in results]) for key in results[0]} if results else {}
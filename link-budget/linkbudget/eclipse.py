@@ -0,0 +1,25 @@
+import numpy as np
+
+from linkbudget.utils import mask_intervals
+
+
+def eclipse_mask(eclipse, settling_samples):
+    """
+    Samples outside eclipse, excluding the settling of the attitude after every eclipse exit. Runs in O(n) by edge
+    detection, so overlapping settling periods cost nothing extra
+    :~numpy.array eclipse: eclipse flags per sample (0 in sunlight, non-zero in penumbra or umbra). A 1 x N array, as
+                           stored in the eclipse .mat files, is flattened
+    :int settling_samples: number of samples, starting at each eclipse exit, that the spacecraft needs to point again
+    :return: boolean mask of the valid samples, and K x 2 array of the [start, stop) intervals of valid samples
+    """
+    in_eclipse = np.ravel(eclipse) != 0
+    n = in_eclipse.size
+
+    # Eclipse exits: the first sunlit sample after an eclipse
+    exits = np.flatnonzero(in_eclipse[:-1] & ~in_eclipse[1:]) + 1
+    # Count the settling periods covering each sample: +1 where one starts, -1 where it ends
+    coverage = np.cumsum(np.bincount(exits, minlength=n + 1)[:n] -
+                         np.bincount(np.minimum(exits + settling_samples, n), minlength=n + 1)[:n])
+
+    valid = ~in_eclipse & (coverage == 0)
+    return valid, mask_intervals(valid)
@@ -0,0 +1,232 @@
+import warnings
+from collections.abc import Mapping
+from itertools import islice
+
+import numpy as np
+
+from linkbudget.profiling import stage
+from linkbudget.stage_cache import file_digest
+
+# Offset of GMAT's modified Julian date (05 Jan 1941 12:00:00.000 UTC)
+GMAT_MJD_EPOCH = np.datetime64('1941-01-05T12:00:00', 'ms')
+
+_MONTHS = np.array(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])
+
+
+def read_gmat_report(path, columns=None, cache=None):
+    """
+    Read a whole GMAT ReportFile in one columnar pass
+    :str path: path to the GMAT report
+    :list columns: columns to read (all if not specified). Columns are named after the last component of the GMAT
+                   header, lower-cased (e.g. 'Sat.Earth.Altitude' -> 'altitude'). Epoch columns (UTCGregorian,
+                   ModJulian) are returned as 'epoch', in numpy.datetime64
+    :~linkbudget.stage_cache.StageCache cache: cache of the parsed columns, keyed on the contents of the report
+    :return: dict of column name -> numpy array
+    """
+    def parse():
+        with open(path, 'r') as f:
+            layout, header_row = _read_header(f)
+        return _load_block(path, layout, columns, skiprows=header_row + 1)
+
+    if cache is None:
+        return parse()
+    return cache.get_or_compute(cache.key('gmat_report', file_digest(path), columns), parse)
+
+
+def iter_gmat_report(path, chunk_size=100000, columns=None):
+    """
+    Read a GMAT ReportFile in fixed-size blocks, so that multi-day, high-rate reports never have to sit in memory
+    :str path: path to the GMAT report
+    :int chunk_size: number of lines per block
+    :list columns: columns to read, see read_gmat_report
+    :return: generator of dicts of column name -> numpy array
+    """
+    with open(path, 'r') as f:
+        layout, _ = _read_header(f)
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+            block = _load_block(lines, layout, columns)
+            if len(next(iter(block.values()))):
+                yield block
+
+
+class PeriodicEphemeris(Mapping):
+    def __init__(self, report, step, n, report_step=None, offset=0., method='hermite', order=4,
+                 angles=('longitude',)):
+        """
+        Ephemeris that repeats a GMAT report periodically and interpolates it to a finer sample rate (e.g. the rate of
+        the ADCS record), without materializing the samples. Columns are indexed like arrays and only the requested
+        samples are interpolated, e.g. ephemeris['altitude'][start:stop]
+        :dict report: GMAT report (see read_gmat_report), with uniformly spaced samples. Its period is the number of
+                      samples times report_step
+        :float step: time between samples (s)
+        :int n: number of samples
+        :float report_step: time between the samples of the report (s). Taken from its 'epoch' column if not specified
+        :float offset: time of the first sample after the start of the report (s)
+        :str method: 'hermite' (cubic, with central-difference slopes), 'lagrange' or 'linear'
+        :int order: number of points of the Lagrange polynomial
+        :tuple angles: columns that wrap at +-180 deg
+        """
+        if method not in ('hermite', 'lagrange', 'linear'):
+            raise ValueError("Unknown interpolation method '{}'".format(method))
+        if report_step is None:
+            if 'epoch' not in report:
+                raise ValueError("report_step must be specified for reports without epoch")
+            steps = np.unique(np.diff(report['epoch']))
+            if len(steps) != 1:
+                raise ValueError("The samples of the GMAT report are not uniformly spaced")
+            report_step = steps[0] / np.timedelta64(1, 's')
+        self.columns = {key: np.asarray(value, dtype=float) for key, value in report.items() if key != 'epoch'}
+        self.step = step
+        self.n = n
+        self.report_step = report_step
+        self.offset = offset
+        self.method = method
+        self.order = order
+        self.angles = angles
+
+        self._slopes = {}
+        if method == 'hermite':
+            for key, value in self.columns.items():
+                forward = self._difference(key, np.roll(value, -1) - value)
+                self._slopes[key] = (forward + np.roll(forward, 1)) / 2
+
+    @property
+    def period(self):
+        """Period of the ephemeris (s)"""
+        return len(next(iter(self.columns.values()))) * self.report_step
+
+    def __getitem__(self, key):
+        if key not in self.columns:
+            raise KeyError(key)
+        return _EphemerisColumn(self, key)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def interpolate(self, key, indices):
+        """
+        Interpolate a column at the given sample indices
+        :str key: column name
+        :~numpy.array indices: sample indices
+        """
+        value = self.columns[key]
+        m = len(value)
+        position = np.mod((self.offset + np.asarray(indices) * self.step) / self.report_step, m)
+        node = np.floor(position).astype(int)
+        fraction = position - node
+        node %= m  # position may round up to m
+        if self.method == 'lagrange':
+            first = node - (self.order - 1) // 2
+            x = fraction + (self.order - 1) // 2
+            result = np.zeros(fraction.shape)
+            for i in range(self.order):
+                weight = np.ones(fraction.shape)
+                for j in range(self.order):
+                    if j != i:
+                        weight *= (x - j) / (i - j)
+                result += weight * self._difference(key, value[(first + i) % m] - value[node])
+        else:
+            delta = self._difference(key, value[(node + 1) % m] - value[node])
+            if self.method == 'linear':
+                result = fraction * delta
+            else:
+                f2, f3 = fraction ** 2, fraction ** 3
+                result = ((-2 * f3 + 3 * f2) * delta + (f3 - 2 * f2 + fraction) * self._slopes[key][node]
+                          + (f3 - f2) * self._slopes[key][(node + 1) % m])
+        result += value[node]
+        return self._difference(key, result)
+
+    def _difference(self, key, delta):
+        """Wrap differences of angle columns to +-180 deg"""
+        return np.mod(delta + 180, 360) - 180 if key in self.angles else delta
+
+
+class _EphemerisColumn:
+    """Array-like view of one column of a PeriodicEphemeris"""
+
+    def __init__(self, ephemeris, key):
+        self.ephemeris = ephemeris
+        self.key = key
+
+    def __len__(self):
+        return self.ephemeris.n
+
+    def __getitem__(self, item):
+        n = self.ephemeris.n
+        if isinstance(item, slice):
+            indices = np.arange(*item.indices(n))
+        else:
+            indices = np.asarray(item)
+            if indices.dtype == bool:
+                indices = np.flatnonzero(indices)
+            indices = np.where(indices < 0, indices + n, indices)
+            if np.any((indices < 0) | (indices >= n)):
+                raise IndexError("Sample index out of range for {} samples".format(n))
+        return self.ephemeris.interpolate(self.key, indices)
+
+    def __array__(self, dtype=None, copy=None):
+        return self[:].astype(dtype) if dtype is not None else self[:]
+
+
+def _read_header(f):
+    """Column layout of the report as a list of (name, first token, number of tokens), and the header line index"""
+    for i, line in enumerate(f):
+        if not line.strip() or line.startswith('#'):
+            continue
+        layout = []
+        token = 0
+        for name in line.split():
+            # Gregorian epochs span four whitespace-separated tokens (01 Jan 2000 11:59:28.000)
+            width = 4 if name.endswith('Gregorian') else 1
+            key = 'epoch' if name.endswith(('Gregorian', 'ModJulian')) else name.split('.')[-1].lower()
+            layout.append((key, token, width))
+            token += width
+        return layout, i
+    raise ValueError("GMAT report has no header")
+
+
+def _load_block(source, layout, columns, skiprows=0):
+    with stage('ephemeris') as parse:
+        block = _parse_block(source, layout, columns, skiprows)
+        parse.samples = len(next(iter(block.values()), ()))
+    return block
+
+
+def _parse_block(source, layout, columns, skiprows):
+    if columns is not None:
+        unknown = set(columns) - {key for key, _, _ in layout}
+        if unknown:
+            raise KeyError("Columns {} are not in the GMAT report".format(sorted(unknown)))
+        layout = [column for column in layout if column[0] in columns]
+
+    numeric = [(key, token) for key, token, width in layout if width == 1]
+    with warnings.catch_warnings():
+        # Blank lines only trigger a warning about the changed max_rows semantics of numpy
+        warnings.simplefilter('ignore', UserWarning)
+        values = np.loadtxt(source, comments='#', skiprows=skiprows, usecols=[token for _, token in numeric],
+                            ndmin=2) if numeric else None
+        block = {key: values[:, i] for i, (key, _) in enumerate(numeric)}
+
+        for key, token, width in layout:
+            if width == 4:
+                date = np.loadtxt(source, dtype=str, comments='#', skiprows=skiprows,
+                                  usecols=range(token, token + 4), ndmin=2)
+                block[key] = _gregorian_to_datetime64(date)
+            elif key == 'epoch':
+                block[key] = GMAT_MJD_EPOCH + np.round(block[key] * 86400000).astype('timedelta64[ms]')
+    return {key: block[key] for key, _, _ in layout}
+
+
+def _gregorian_to_datetime64(date):
+    """Convert N x 4 GMAT Gregorian tokens (day, month, year, time) to numpy.datetime64"""
+    months, inverse = np.unique(date[:, 1], return_inverse=True)
+    month_numbers = np.array(['{:02d}'.format(np.flatnonzero(_MONTHS == month)[0] + 1) for month in months])
+    iso = np.char.add(np.char.add(np.char.add(date[:, 2], '-'), month_numbers[inverse]), '-')
+    iso = np.char.add(np.char.add(np.char.add(iso, np.char.zfill(date[:, 0], 2)), 'T'), date[:, 3])
+    return iso.astype('datetime64[ms]')
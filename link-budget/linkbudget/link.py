@@ -1,11 +1,15 @@
+import abc
+import copy
+
+import numpy as np
 from astropy import units as u
 from numpy import log10, cos
 from pycraf import conversions as cnv
 
-from linkbudget.utils import slant_range
+from linkbudget.utils import slant_range, slant_range_km, to_float
 
 
-class Link:
+class Link(abc.ABC):
     # TODO: Proper implementation of losses and modulation
     def __init__(self, ground_station, spacecraft, freq, elev_angle, additional_losses, ber,
                  allowed_ber, mod_loss, eb_to_no):
@@ -26,9 +30,87 @@ class Link:
 
     @property
     def path_loss(self):
+        return self._path_loss(self.slant_range)
+
+    def _path_loss(self, d):
         c0 = 299792458 * u.m / u.s
         l = c0 / self.freq
-        return (21.9842 + 20 * log10(self.slant_range / l)) * u.dB
+        return (21.9842 + 20 * log10(d / l)) * u.dB
+
+    @property
+    def total_losses(self):
+        return self._total_losses(self.path_loss, self.spacecraft.pointing_loss)
+
+    @property
+    def s_to_no(self):
+        """Signal-to-Noise Power Density"""
+        return self._s_to_no(self.total_losses, self.spacecraft.pointing_loss)
+
+    @property
+    def system_eb_to_no(self):
+        """Required Eb/no"""
+        return self.s_to_no - 10 * log10(self.ber) * u.dB(u.Hz)
+
+    @property
+    def link_margin(self):
+        return self.system_eb_to_no - self.eb_to_no - self.mod_loss
+
+    def link_margin_series(self, elev_angle, sc_altitude=None, pointing_loss=None):
+        """
+        Link margin for a whole series of geometries in one broadcasted call. The static terms of the budget are
+        evaluated once, only the slant range, path loss and pointing loss follow the arrays.
+        :~astropy.units.Unit elev_angle: elevation angles (plain arrays are taken in deg)
+        :~astropy.units.Unit sc_altitude: spacecraft altitudes (plain arrays are taken in km). Defaults to the
+                                          altitude of the spacecraft
+        :~astropy.units.Unit pointing_loss: spacecraft pointing losses (plain arrays are taken in dB). Defaults to
+                                            the pointing loss of the spacecraft
+        """
+        elev_angle = _as_quantity(elev_angle, u.deg)
+        sc_altitude = self.spacecraft.sc_altitude if sc_altitude is None else _as_quantity(sc_altitude, u.km)
+        pointing_loss = self.spacecraft.pointing_loss if pointing_loss is None else _as_quantity(pointing_loss,
+                                                                                               cnv.dB)
+
+        d = slant_range(sc_altitude, self.ground_station.gs_altitude, elev_angle)
+        s_to_no = self._s_to_no(self._total_losses(self._path_loss(d), pointing_loss), pointing_loss)
+        return s_to_no - 10 * log10(self.ber) * u.dB(u.Hz) - self.eb_to_no - self.mod_loss
+
+    def with_parameters(self, parameters):
+        """
+        Copy of the link with parameters of the link or of its components replaced, e.g. by arrays that the budget
+        is then broadcast over. Only the objects along the parameter paths are copied, the link itself is left as is
+        :dict parameters: values keyed on the attribute path from the link, e.g. {'freq': [435, 437] * u.MHz,
+                          'ground_station.gs_receiver.lna_temperature': 28 * u.K}. Plain numbers and arrays are
+                          taken in the unit of the current value
+        """
+        link = copy.copy(self)
+        copies = {}
+        for path, value in parameters.items():
+            owner, name = _owner(link, path, copies)
+            current = getattr(owner, name)
+            if isinstance(current, u.Quantity):
+                value = value.to(current.unit) if isinstance(value, u.Quantity) else \
+                    np.asarray(value, dtype=float) * current.unit
+            setattr(owner, name, value)
+        return link
+
+    def parameter(self, path):
+        """
+        Current value of a parameter of the link or of its components
+        :str path: attribute path from the link, e.g. 'ground_station.gs_receiver.lna_temperature'
+        """
+        return getattr(*_owner(self, path))
+
+    def compile(self):
+        """Fold the static terms of the budget into a ~linkbudget.link.LinkPlan for fast evaluation on floats"""
+        return LinkPlan(self)
+
+    @abc.abstractmethod
+    def _total_losses(self, path_loss, sc_pointing_loss):
+        """Total losses of the link, from the path loss and the spacecraft pointing loss"""
+
+    @abc.abstractmethod
+    def _s_to_no(self, total_losses, sc_pointing_loss):
+        """Signal-to-Noise Power Density, from the total losses and the spacecraft pointing loss"""
 
     @classmethod
     def polarization_loss(cls, var_rw, var_ra, var_theta):
@@ -65,24 +147,12 @@ class Downlink(Link):
         """Signal level that would be received at an isotropic antenna on the ground station"""
         return self.spacecraft.spacecraft_eirp - self.total_losses
 
-    @property
-    def s_to_no(self):
-        """Signal-to-Noise Power Density"""
-        return self.isotropic_signal_level_gs - self.spacecraft.pointing_loss + 228.599 * u.dB(
+    def _s_to_no(self, total_losses, sc_pointing_loss):
+        return self.spacecraft.spacecraft_eirp - total_losses - sc_pointing_loss + 228.599 * u.dB(
             u.W / u.K / u.Hz) + self.ground_station.figure_of_merit
 
-    @property
-    def system_eb_to_no(self):
-        """Required Eb/no"""
-        return self.s_to_no - 10 * log10(self.ber) * u.dB(u.Hz)
-
-    @property
-    def link_margin(self):
-        return self.system_eb_to_no - self.eb_to_no - self.mod_loss
-
-    @property
-    def total_losses(self):
-        return self.additional_losses + self.path_loss + self.ground_station.pointing_loss
+    def _total_losses(self, path_loss, sc_pointing_loss):
+        return self.additional_losses + path_loss + self.ground_station.pointing_loss
 
 
 class Uplink(Link):
@@ -108,21 +178,74 @@ class Uplink(Link):
         """Signal level that would be received at an isotropic antenna on the spacecraft"""
         return self.ground_station.ground_station_eirp - self.total_losses
 
-    @property
-    def s_to_no(self):
-        """Signal-to-Noise Power Density"""
-        return self.isotropic_signal_level_sc - self.spacecraft.pointing_loss + 228.6 * u.dB(
+    def _s_to_no(self, total_losses, sc_pointing_loss):
+        return self.ground_station.ground_station_eirp - total_losses - sc_pointing_loss + 228.6 * u.dB(
             u.W / u.K / u.Hz) + self.spacecraft.figure_of_merit
 
-    @property
-    def system_eb_to_no(self):
-        """Required Eb/no"""
-        return self.s_to_no - 10 * log10(self.ber) * u.dB(u.Hz)
+    def _total_losses(self, path_loss, sc_pointing_loss):
+        return self.additional_losses + path_loss + sc_pointing_loss
 
-    @property
-    def link_margin(self):
-        return self.system_eb_to_no - self.eb_to_no - self.mod_loss
 
-    @property
-    def total_losses(self):
-        return self.additional_losses + self.path_loss + self.spacecraft.pointing_loss
+class LinkPlan:
+    def __init__(self, link):
+        """
+        Compiled link budget. The static terms (EIRP, G/T, fixed losses, Boltzmann's constant, bit rate, required
+        Eb/no) are folded into float64 constants once, through the unit-checked property chain of the link. Only the
+        slant range and the spacecraft pointing loss are then evaluated, on raw arrays.
+        Changes to the link after compiling are not reflected in the plan.
+        :~linkbudget.link.Link link: link to compile
+        """
+        zero = 0 * cnv.dB
+        one = 1 * cnv.dB
+
+        def static_margin(sc_pointing_loss):
+            # Margin over a lossless path (path loss of 0 dB)
+            s_to_no = link._s_to_no(link._total_losses(zero, sc_pointing_loss), sc_pointing_loss)
+            return (s_to_no - 10 * log10(link.ber) * u.dB(u.Hz) - link.eb_to_no - link.mod_loss).value
+
+        wavelength = (299792458 * u.m / u.s / link.freq).to_value(u.km)
+        self.gs_altitude = link.ground_station.gs_altitude.to_value(u.km)
+        # Path loss is 21.9842 + 20 log10(d / wavelength), only the slant range d (in km) is left out
+        self.constant = static_margin(zero) - 21.9842 + 20 * np.log10(wavelength)
+        # dB of margin lost per dB of spacecraft pointing loss
+        self.pointing_loss_factor = static_margin(zero) - static_margin(one)
+
+    def link_margin(self, elev_angle, sc_altitude, pointing_loss=0.):
+        """
+        Link margin (dB, as float64)
+        :~numpy.array elev_angle: elevation angles (deg). Quantities are converted once
+        :~numpy.array sc_altitude: spacecraft altitudes (km)
+        :~numpy.array pointing_loss: spacecraft pointing losses (dB)
+        """
+        d = slant_range_km(to_float(sc_altitude, u.km), self.gs_altitude, to_float(elev_angle, u.deg))
+        return self.constant - 20 * np.log10(d) - self.pointing_loss_factor * to_float(pointing_loss, u.dB)
+
+
+def _owner(link, path, copies=None):
+    """
+    Object holding the parameter at an attribute path from the link, and the name of the parameter in it
+    :dict copies: if specified, the objects along the path are copied and re-linked to their (copied) parents, and
+                  the copies are kept in it, keyed on their attribute path, to be shared by the other paths
+    """
+    names = path.split('.')
+    owner = link
+    for i, name in enumerate(names):
+        if not hasattr(owner, name):
+            raise AttributeError("{} has no parameter '{}'".format(type(link).__name__, path))
+        if i == len(names) - 1:
+            break
+        if copies is None:
+            owner = getattr(owner, name)
+            continue
+        prefix = '.'.join(names[:i + 1])
+        if prefix not in copies:
+            copies[prefix] = copy.copy(getattr(owner, name))
+            setattr(owner, name, copies[prefix])
+        owner = copies[prefix]
+    return owner, names[-1]
+
+
+def _as_quantity(value, unit):
+    """Attach ``unit`` to plain numbers and arrays, leave quantities untouched"""
+    return value if isinstance(value, u.Quantity) else value * unit
+
@@ -0,0 +1,72 @@
+import json
+import os
+
+import numpy as np
+import scipy.io
+
+from linkbudget.utils import replace_file
+
+METADATA = 'metadata.json'
+
+
+def cache_directory(mat_path):
+    """Default cache directory of a .mat file: .cache/<name> next to it"""
+    directory, name = os.path.split(os.path.abspath(mat_path))
+    return os.path.join(directory, '.cache', os.path.splitext(name)[0])
+
+
+def convert_mat(mat_path, cache_dir=None, nan=0.):
+    """
+    Store every variable of a .mat file (e.g. ADCS errors, eclipse flags) as a .npy file that can be memory-mapped,
+    with a small JSON metadata sidecar
+    :str mat_path: path to the .mat file
+    :str cache_dir: directory of the cache (see cache_directory if not specified)
+    :float nan: value replacing the NaNs of floating point variables (None to keep them)
+    :return: the metadata
+    """
+    cache_dir = cache_directory(mat_path) if cache_dir is None else cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+
+    variables = {}
+    for name, value in scipy.io.loadmat(mat_path).items():
+        if name.startswith('__') or not isinstance(value, np.ndarray) or value.dtype.hasobject:
+            continue
+        if nan is not None and value.dtype.kind == 'f':
+            value[np.isnan(value)] = nan
+        file = name + '.npy'
+        replace_file(os.path.join(cache_dir, file), lambda f: np.save(f, value))
+        variables[name] = {'file': file, 'shape': list(value.shape), 'dtype': value.dtype.str}
+
+    stat = os.stat(mat_path)
+    metadata = {'source': os.path.abspath(mat_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'nan': nan,
+                'variables': variables}
+    # The metadata is written last, so that a cache is only ever seen complete
+    replace_file(os.path.join(cache_dir, METADATA), lambda f: f.write(json.dumps(metadata, indent=2).encode()))
+    return metadata
+
+
+def load_mat(mat_path, cache_dir=None, nan=0.):
+    """
+    Variables of a .mat file as read-only memory maps. The file is converted on first use, and again whenever it
+    changes, so that repeated runs and parallel workers open it instantly and share pages
+    :str mat_path: path to the .mat file
+    :str cache_dir: directory of the cache (see cache_directory if not specified)
+    :float nan: value replacing the NaNs of floating point variables (None to keep them)
+    :return: dict of variable name -> numpy.memmap
+    """
+    cache_dir = cache_directory(mat_path) if cache_dir is None else cache_dir
+    metadata = _read_metadata(cache_dir)
+    stat = os.stat(mat_path)
+    if metadata is None or (metadata['size'], metadata['mtime_ns'], metadata['nan']) != (stat.st_size,
+                                                                                         stat.st_mtime_ns, nan):
+        metadata = convert_mat(mat_path, cache_dir, nan)
+    return {name: np.load(os.path.join(cache_dir, variable['file']), mmap_mode='r')
+            for name, variable in metadata['variables'].items()}
+
+
+def _read_metadata(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, METADATA)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
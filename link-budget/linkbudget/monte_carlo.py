@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from astropy import units as u
+
+
+class Normal:
+    def __init__(self, sigma):
+        """Normally distributed deviation from the nominal value, with standard deviation sigma"""
+        self.sigma = sigma
+
+    def deviations(self, rng, size):
+        return rng.normal(0., self.sigma, size)
+
+
+class Uniform:
+    def __init__(self, tolerance):
+        """Uniformly distributed deviation from the nominal value within +-tolerance"""
+        self.tolerance = tolerance
+
+    def deviations(self, rng, size):
+        return rng.uniform(-self.tolerance, self.tolerance, size)
+
+
+class Triangular:
+    def __init__(self, tolerance):
+        """Triangularly distributed deviation from the nominal value within +-tolerance, peaking at 0"""
+        self.tolerance = tolerance
+
+    def deviations(self, rng, size):
+        return rng.triangular(-self.tolerance, 0., self.tolerance, size)
+
+
+class MonteCarlo:
+    def __init__(self, link, tolerances, draws=10000, chunk_size=10000, seed=None, max_workers=1):
+        """
+        Monte Carlo analysis of the link margin. The parameters of the link and of its components are replaced by
+        arrays of draws, so the whole budget is evaluated for a chunk of draws in one broadcasted pass
+        :~linkbudget.link.Link link: nominal link
+        :dict tolerances: distribution (Normal, Uniform, Triangular) of the deviation of each parameter from its
+                          nominal value, in the unit of the parameter, keyed on the attribute path from the link,
+                          e.g. {'mod_loss': Uniform(0.5), 'ground_station.gs_receiver.lna_temperature': Normal(10)}
+        :int draws: number of draws
+        :int chunk_size: number of draws evaluated at once. Every chunk has its own random stream spawned from the
+                         seed, so results only depend on the seed and the chunk size
+        :int seed: seed of the random streams
+        :int max_workers: number of worker processes. 1 evaluates in this process, None uses one process per CPU
+        """
+        for path in tolerances:
+            link.parameter(path)  # Fail early on unknown parameters
+        self.link = link
+        self.tolerances = tolerances
+        self.draws = draws
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.max_workers = max_workers
+
+    def run(self, elev_angle=None, sink=None):
+        """
+        :~numpy.array elev_angle: elevation angles (deg) at which every draw is evaluated. Defaults to the elevation
+                                  angle of the link
+        :callable sink: called with the results of every chunk. If not specified, the results are concatenated and
+                        returned
+        :return: dict of 'link_margin' (draws, or draws x elevation angles, in dB) and the drawn values of every
+                 parameter
+        """
+        sizes = [min(self.chunk_size, self.draws - start) for start in range(0, self.draws, self.chunk_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        tasks = [(self.link, self.tolerances, size, seed, elev_angle) for size, seed in zip(sizes, seeds)]
+
+        if self.max_workers == 1:
+            chunks = (_evaluate_chunk(*task) for task in tasks)
+            return self._collect(chunks, sink)
+        with ProcessPoolExecutor(self.max_workers) as executor:
+            return self._collect(executor.map(_evaluate_chunk, *zip(*tasks)), sink)
+
+    @staticmethod
+    def _collect(chunks, sink):
+        results = []
+        for chunk in chunks:
+            if sink is None:
+                results.append(chunk)
+            else:
+                sink(chunk)
+        if sink is None:
+            return {key: np.concatenate([chunk[key] for chunk in results]) for key in results[0]} if results else {}
+
+
+def exceedance_probability(link_margin, thresholds=0.):
+    """
+    Probability that the link margin exceeds the thresholds, over the draws (first axis)
+    :~numpy.array link_margin: margins of the draws (dB), see MonteCarlo.run
+    :thresholds: margin threshold(s) (dB)
+    :return: array of probabilities, one per threshold (and elevation angle)
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    link_margin = np.asarray(link_margin, dtype=float)
+    exceeds = link_margin[..., np.newaxis] > thresholds.reshape((1,) * link_margin.ndim + (-1,))
+    probability = np.mean(exceeds, axis=0)
+    return probability.reshape(probability.shape[:-1] + thresholds.shape)
+
+
+def _evaluate_chunk(link, tolerances, size, seed, elev_angle):
+    rng = np.random.default_rng(seed)
+    shape = (size,) if elev_angle is None else (size, 1)
+    samples = {}
+    for path, distribution in tolerances.items():
+        nominal = link.parameter(path)
+        samples[path] = np.asarray(getattr(nominal, 'value', nominal), dtype=float) + distribution.deviations(rng,
+                                                                                                             size)
+    parameters = {path: value.reshape(shape) for path, value in samples.items()}
+    if elev_angle is not None:
+        parameters['elev_angle'] = np.asarray(elev_angle, dtype=float)[np.newaxis, :] * u.deg
+
+    link_margin = link.with_parameters(parameters).link_margin.value
+    shape = shape if elev_angle is None else (size, np.size(elev_angle))
+    return dict(link_margin=np.array(np.broadcast_to(link_margin, shape)), **samples)
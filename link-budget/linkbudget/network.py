@@ -0,0 +1,101 @@
+from functools import partial
+
+import numpy as np
+from astropy import units as u
+
+from linkbudget.dynamic import DynamicLink, R_EARTH, iter_chunks, run_chunks
+from linkbudget.utils import elevation_angle, geodetic_to_ecef, ecef_position
+
+# Margin (deg) on the central angle of the visibility pre-filter, for the ellipsoid and the altitude of the stations
+_CENTRAL_ANGLE_MARGIN = 1.
+
+
+class GroundStationNetwork:
+    def __init__(self, stations, chunk_size=100000, min_elevation=0., cache=None, fold_theta=False):
+        """
+        Dynamic link budget of one spacecraft over a network of ground stations. Station positions are converted
+        once; each chunk of the trajectory is then pre-filtered per station on the central angle between spacecraft
+        and station (one matrix product), and the elevation and link stages only run on the pairs that can be in
+        contact, so that the cost follows the contact time rather than the number of stations
+        :dict stations: (link, location) of every station, keyed on its name. Every link has the ground station and
+                        the spacecraft of that station, see ~linkbudget.dynamic.DynamicLink
+        :int chunk_size: number of samples per chunk
+        :float min_elevation: elevation mask (deg)
+        :~linkbudget.stage_cache.StageCache cache: on-disk cache of the link stages of every station
+        :bool fold_theta: fold the theta angles beyond +-90 deg back into the pattern, see
+                          ~linkbudget.dynamic.DynamicLink
+        """
+        self.names = list(stations)
+        self.chunk_size = chunk_size
+        self.min_elevation = min_elevation
+        self._dynamic = [DynamicLink(link, location, chunk_size, min_elevation, cache, fold_theta)
+                         for link, location in stations.values()]
+        self._positions = np.stack([ecef_position(location) for _, location in stations.values()])
+        self._directions = self._positions / np.linalg.norm(self._positions, axis=-1, keepdims=True)
+
+    def process(self, block, attitude=None, plans=None):
+        """
+        Run all stations on one chunk
+        :dict block: ephemeris with 'altitude' (km), 'latitude' and 'longitude' (deg) arrays
+        :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg
+        :list plans: compiled plans of the links of the stations (compiled here if not specified)
+        :return: dict of N x stations arrays of 'elev_angle', 'theta', 'phi', 'gain', 'pointing_loss' and
+                 'link_margin' (NaN where the station has no contact; the elevation is also NaN where it is far
+                 below the horizon), and of the 'best_station' (index in names, -1 without contact) and
+                 'best_margin' series
+        """
+        altitude = np.asarray(block['altitude'], dtype=float)
+        sat = geodetic_to_ecef(block['longitude'], block['latitude'], altitude * 1000)
+        n, m = len(altitude), len(self.names)
+        if plans is None:
+            plans = self.compile()
+
+        # Widest central angle at which a station can see the spacecraft above the elevation mask (spherical Earth)
+        radius = np.linalg.norm(sat, axis=-1)
+        cos_mask = np.cos(np.deg2rad(self.min_elevation))
+        central_angle = np.arccos(np.clip(R_EARTH * 1000 / radius * cos_mask, -1, 1)) - \
+            np.deg2rad(self.min_elevation) + np.deg2rad(_CENTRAL_ANGLE_MARGIN)
+        candidates = (sat / radius[:, np.newaxis]) @ self._directions.T >= np.cos(central_angle)[:, np.newaxis]
+        samples, stations = np.nonzero(candidates)
+
+        result = {key: np.full((n, m), np.nan) for key in ('elev_angle', 'theta', 'phi', 'gain', 'pointing_loss',
+                                                          'link_margin')}
+        elev_angle = elevation_angle(sat[samples], self._positions[stations]).to_value(u.deg)
+        result['elev_angle'][samples, stations] = elev_angle
+        visible = elev_angle >= self.min_elevation
+        samples, stations, elev_angle = samples[visible], stations[visible], elev_angle[visible]
+
+        for station in range(m):
+            contact = stations == station
+            if not np.any(contact):
+                continue
+            rows = samples[contact]
+            stages = self._dynamic[station].link_stages(elev_angle[contact], altitude[rows],
+                                                         None if attitude is None else attitude[rows],
+                                                         plans[station])
+            for key, value in stages.items():
+                result[key][rows, station] = value
+
+        margin = result['link_margin']
+        contact = ~np.all(np.isnan(margin), axis=1)
+        best = np.argmax(np.where(np.isnan(margin), -np.inf, margin), axis=1)
+        result['best_station'] = np.where(contact, best, -1)
+        result['best_margin'] = np.where(contact, margin[np.arange(n), best], np.nan)
+        return result
+
+    def run(self, ephemeris, attitude=None, sink=None):
+        """
+        Run the network over a whole simulation
+        :ephemeris: dict of ephemeris arrays (see process), a ~linkbudget.ephemeris.PeriodicEphemeris, or an
+                    iterable of blocks, e.g. from ~linkbudget.ephemeris.iter_gmat_report
+        :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg, aligned with the ephemeris samples
+        :callable sink: called with the results of every chunk. If not specified, the results are concatenated and
+                        returned
+        """
+        # The links are compiled once for the whole run
+        process = partial(self.process, plans=self.compile())
+        return run_chunks(process, iter_chunks(ephemeris, self.chunk_size), attitude, sink)
+
+    def compile(self):
+        """Compiled plans (see ~linkbudget.link.Link.compile) of the links of the stations"""
+        return [dynamic.link.compile() for dynamic in self._dynamic]
@@ -0,0 +1,46 @@
+import numpy as np
+
+from linkbudget.utils import mask_intervals
+
+
+def find_passes(elev_angle, min_elevation=0., time=None):
+    """
+    Contact windows of a spacecraft over a ground station, found by sign-change detection on the elevation series
+    :~numpy.array elev_angle: elevation angles (deg), e.g. from ~linkbudget.utils.elevation_angle
+    :float min_elevation: elevation mask (deg)
+    :~numpy.array time: time of each sample. If specified, AOS/LOS are also interpolated linearly to the crossing of
+                        the elevation mask
+    :return: dict of arrays, one entry per pass: 'aos' and 'los' ([start, stop) sample indices), 'max_elevation'
+             and, if time is given, 'aos_time' and 'los_time'
+    """
+    elev_angle = np.asarray(elev_angle, dtype=float)
+    intervals = mask_intervals(elev_angle >= min_elevation)
+    aos, los = intervals[:, 0], intervals[:, 1]
+
+    # Maximum over [aos, los) of every pass; the sentinel keeps los == n a valid index for reduceat
+    padded = np.append(elev_angle, -np.inf)
+    max_elevation = np.maximum.reduceat(padded, intervals.ravel())[::2] if len(aos) else np.empty(0)
+    passes = {'aos': aos, 'los': los, 'max_elevation': max_elevation}
+
+    if time is not None:
+        time = np.asarray(time, dtype=float)
+        if not len(aos):
+            # No pass (e.g. an empty series, which has no first and last time either)
+            passes['aos_time'] = passes['los_time'] = np.empty(0)
+            return passes
+        passes['aos_time'] = _crossing(elev_angle, time, aos - 1, min_elevation, time[0])
+        passes['los_time'] = _crossing(elev_angle, time, los - 1, min_elevation, time[-1])
+    return passes
+
+
+def _crossing(elev_angle, time, before, min_elevation, edge_time):
+    """Time at which the elevation crosses the mask between the samples ``before`` and ``before + 1``"""
+    n = elev_angle.size
+    # Passes in progress at the start or end of the series have no crossing, they get ``edge_time``
+    edge = (before < 0) | (before >= n - 1)
+    before = np.clip(before, 0, max(n - 2, 0))
+    after = np.minimum(before + 1, n - 1)
+    step = elev_angle[after] - elev_angle[before]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(step != 0, (min_elevation - elev_angle[before]) / step, 0.)
+    return np.where(edge, edge_time, time[before] + fraction * (time[after] - time[before]))
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Profiler recording the stages, None when profiling is off
+_active = None
+
+
+class _NullStage:
+    """Stage of a disabled profiler: a shared, reusable context manager that records nothing"""
+    __slots__ = ('samples',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, samples=0):
+    """
+    Context manager timing a stage of the pipeline with the active profiler. When profiling is off it returns a
+    shared no-op context, so instrumented code costs one global lookup and comparison.
+    The number of samples can also be set on the returned stage when it is only known at the end, e.g.
+    ``with stage('ephemeris') as s: ... s.samples = n``
+    :str name: name of the stage
+    :int samples: number of samples processed by the stage
+    """
+    profiler = _active
+    if profiler is None:
+        return _NULL_STAGE
+    return _Stage(profiler, name, samples)
+
+
+def enable(memory=False):
+    """Start profiling the stages with a new profiler (see Profiler) and return it"""
+    profiler = Profiler(memory)
+    profiler.start()
+    return profiler
+
+
+def disable():
+    """Stop profiling and return the profiler that was active (or None)"""
+    profiler = _active
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'samples', 'start', 'memory', 'peak', 'child_peak')
+
+    def __init__(self, profiler, name, samples):
+        self.profiler = profiler
+        self.name = name
+        self.samples = samples
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if self.profiler.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # The peak is reset for every stage, so the enclosing stage keeps the peak it has reached so far
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory = current
+            self.child_peak = current
+        else:
+            self.memory = None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        stack = self.profiler._stack()
+        stack.pop()
+        memory = peak = None
+        if self.memory is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+            if stack and stack[-1].memory is not None:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            memory, peak = current - self.memory, peak - self.memory
+        self.profiler._record(self.name, self.start, end - self.start, self.samples, memory, peak, len(stack))
+        return False
+
+
+class Profiler:
+    def __init__(self, memory=False):
+        """
+        Record of the wall time, number of samples and allocated memory of every stage run (see stage), in the order
+        the stages complete, e.g. ``with Profiler(memory=True) as profile: link.run(ephemeris)``. Stages run in the
+        worker processes of a ~concurrent.futures.ProcessPoolExecutor aren't recorded
+        :bool memory: also record the memory allocated by every stage through tracemalloc. Slows down the stages
+                      that allocate many small objects
+        """
+        self.memory = memory
+        self.events = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracing = False
+        self._running = False
+        self._previous = None
+
+    def start(self):
+        """Make this profiler the active one"""
+        global _active
+        if self._running:
+            raise RuntimeError("The profiler is already running")
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._previous, _active = _active, self
+        self._running = True
+
+    def stop(self):
+        """
+        Stop recording, reactivating the profiler that was active before start. Profilers are nested: the last one
+        started has to be stopped first
+        """
+        global _active
+        if not self._running:
+            return
+        if _active is not self:
+            raise RuntimeError("Profilers have to be stopped in the reverse order of their start")
+        _active, self._previous = self._previous, None
+        self._running = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _record(self, name, start, duration, samples, memory, peak, depth):
+        event = {
+            'name': name,
+            'start': start - self._origin,
+            'duration': duration,
+            'samples': int(samples),
+            'depth': depth,
+            'thread': threading.get_ident(),
+        }
+        if memory is not None:
+            event['memory'] = memory
+            event['peak'] = peak
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """
+        Totals of every stage, in the order they first completed
+        :return: dict of stage name -> dict of 'calls', 'time' (s), 'samples', 'rate' (samples/s, None if the stage
+                 took no measurable time) and, when memory is recorded, 'memory' (net allocated bytes) and 'peak' (highest allocation above the start, bytes)
+        """
+        summary = {}
+        for event in self.events:
+            total = summary.setdefault(event['name'], {'calls': 0, 'time': 0., 'samples': 0})
+            total['calls'] += 1
+            total['time'] += event['duration']
+            total['samples'] += event['samples']
+            if 'memory' in event:
+                total['memory'] = total.get('memory', 0) + event['memory']
+                total['peak'] = max(total.get('peak', 0), event['peak'])
+        for total in summary.values():
+            total['rate'] = total['samples'] / total['time'] if total['time'] > 0 else None
+        return summary
+
+    def to_json(self, path):
+        """Write the stage summary and all events as JSON"""
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'events': self.events}, f, indent=2)
+
+    def chrome_trace(self):
+        """Events in the Chrome trace event format (chrome://tracing, Perfetto), as complete ('X') events in µs"""
+        pid = os.getpid()
+        events = []
+        for event in self.events:
+            args = {key: event[key] for key in ('samples', 'memory', 'peak') if key in event}
+            events.append({'name': event['name'], 'cat': 'linkbudget', 'ph': 'X', 'ts': event['start'] * 1e6,
+                           'dur': event['duration'] * 1e6, 'pid': pid, 'tid': event['thread'], 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def to_chrome_trace(self, path):
+        """Write the events as a Chrome trace event file"""
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import zipfile
+from collections.abc import Mapping
+
+import numpy as np
+from astropy import units as u
+
+from linkbudget.utils import replace_file
+
+
+def file_digest(path):
+    """SHA-256 of the contents of a file, to key cached results on input files rather than on their paths"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(*parts):
+    """
+    SHA-256 of the contents of arrays, quantities, numbers, strings, containers and component objects (through their
+    attributes, skipping those listed in their ``_transient`` attribute, e.g. lazily cached values)
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        _update(digest, part, set())
+    return digest.hexdigest()
+
+
+def _update(digest, value, visiting):
+    if isinstance(value, u.Quantity):
+        digest.update(b'Q' + str(value.unit).encode())
+        _update(digest, np.asarray(value.value), visiting)
+    elif isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        digest.update('A{}{}'.format(value.dtype.str, value.shape).encode())
+        digest.update(value.view(np.uint8) if value.dtype.kind != 'V' else value.tobytes())
+    elif value is None or isinstance(value, (str, bytes, bool, int, float, complex, np.generic)):
+        digest.update('S{!r}'.format(value).encode())
+    elif isinstance(value, (list, tuple)):
+        digest.update('L{}'.format(len(value)).encode())
+        for item in value:
+            _update(digest, item, visiting)
+    elif isinstance(value, dict):
+        digest.update('D{}'.format(len(value)).encode())
+        for key in sorted(value, key=str):
+            _update(digest, key, visiting)
+            _update(digest, value[key], visiting)
+    elif hasattr(value, '__dict__') and not callable(value):
+        # Functions and classes have attributes too, but not their code
+        if id(value) in visiting:
+            raise ValueError("Can't hash the cyclic object {!r}".format(value))
+        visiting.add(id(value))
+        digest.update('O{}.{}'.format(type(value).__module__, type(value).__qualname__).encode())
+        transient = getattr(value, '_transient', ())
+        _update(digest, {key: item for key, item in vars(value).items() if key not in transient}, visiting)
+        visiting.discard(id(value))
+    elif isinstance(value, Mapping):
+        _update(digest, dict(value), visiting)
+    else:
+        raise TypeError("Can't hash objects of type {}".format(type(value).__name__))
+
+
+class StageCache:
+    def __init__(self, directory, max_bytes=1 << 30):
+        """
+        Content-addressed on-disk cache of pipeline stage outputs (dicts of arrays), stored as .npz files named after
+        the hash of the stage inputs. The least recently used entries are evicted once the cache exceeds max_bytes.
+        The size of the cache is tracked in memory between evictions, which rescan the directory (so that the entries
+        of other processes sharing it are accounted for there)
+        :str directory: directory of the cache
+        :int max_bytes: maximum size of the cache (bytes)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = self.size
+
+    @staticmethod
+    def key(*parts):
+        """Key of a stage output, from the name of the stage and all of its inputs (see content_hash)"""
+        return content_hash(*parts)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """The cached arrays, or None"""
+        path = self._path(key)
+        try:
+            with np.load(path) as arrays:
+                result = dict(arrays)
+            # The modification time tracks the last use, for the LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            # Corrupt entry (e.g. truncated by a full disk): drop it, so that it is computed again
+            self._remove(path)
+            return None
+        return result
+
+    def put(self, key, arrays):
+        path = self._path(key)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        replace_file(path, lambda f: np.savez(f, **arrays))
+        self._size += os.path.getsize(path) - previous
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def get_or_compute(self, key, compute):
+        """Cached arrays of a stage, computed and stored on a miss"""
+        arrays = self.get(key)
+        if arrays is None:
+            self.misses += 1
+            arrays = compute()
+            self.put(key, arrays)
+        else:
+            self.hits += 1
+        return arrays
+
+    @property
+    def size(self):
+        """Total size of the cache (bytes)"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            os.remove(path)
+        self._size = 0
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self._size -= size
+
+    def _entries(self):
+        """(path, size, last use) of every entry"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return entries
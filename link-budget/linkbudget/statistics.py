@@ -0,0 +1,178 @@
+import numpy as np
+
+from linkbudget.utils import mask_intervals
+
+
+class RunningStatistics:
+    def __init__(self, thresholds=(), low=-100., high=100., bins=20000):
+        """
+        Constant-memory statistics of a series fed chunk by chunk: mean and variance (merged per chunk with Chan's
+        formula), extremes, histogram-based percentiles and number of samples above and below thresholds. NaN
+        samples are ignored
+        :list thresholds: values whose exceedances are counted
+        :float low: lower edge of the histogram
+        :float high: upper edge of the histogram
+        :int bins: number of bins of the histogram, i.e. the resolution of the percentiles is (high - low) / bins
+        """
+        self.thresholds = np.atleast_1d(np.asarray(thresholds, dtype=float))
+        self.edges = np.linspace(low, high, bins + 1)
+        # Underflow and overflow bins on either side
+        self.histogram = np.zeros(bins + 2, dtype=np.int64)
+        self.above = np.zeros(self.thresholds.size, dtype=np.int64)
+        self.below = np.zeros(self.thresholds.size, dtype=np.int64)
+        self.count = 0
+        self.mean = np.nan
+        self._m2 = 0.
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    @property
+    def variance(self):
+        return self._m2 / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        self._combine(values.size, values.mean(), np.sum((values - values.mean()) ** 2), values.min(),
+                      values.max())
+        self.histogram += np.bincount(np.searchsorted(self.edges, values, side='right'),
+                                      minlength=self.histogram.size)
+        self.above += np.count_nonzero(values[:, np.newaxis] > self.thresholds, axis=0)
+        self.below += np.count_nonzero(values[:, np.newaxis] < self.thresholds, axis=0)
+
+    def merge(self, other):
+        """Add the samples of another accumulator with the same thresholds and histogram, e.g. of another run"""
+        if not np.array_equal(self.edges, other.edges) or not np.array_equal(self.thresholds, other.thresholds):
+            raise ValueError("Statistics with different histograms or thresholds can't be merged")
+        if other.count:
+            self._combine(other.count, other.mean, other._m2, other.minimum, other.maximum)
+            self.histogram += other.histogram
+            self.above += other.above
+            self.below += other.below
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        if self.count:
+            delta = mean - self.mean
+            self._m2 += m2 + delta ** 2 * self.count * count / total
+            self.mean += delta * count / total
+        else:
+            self.mean, self._m2 = mean, m2
+        self.count = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def percentile(self, q):
+        """
+        Approximate percentiles, interpolated linearly within the histogram bins
+        :q: percentile(s) in [0, 100]
+        """
+        q = np.asarray(q, dtype=float)
+        if not self.count:
+            return np.full(q.shape, np.nan)
+        cumulative = np.cumsum(self.histogram)
+        rank = np.clip(q / 100 * self.count, 0, self.count)
+        k = np.minimum(np.searchsorted(cumulative, rank, side='left'), self.histogram.size - 1)
+        before = np.where(k > 0, cumulative[k - 1], 0)
+        # Bin k covers [edges[k - 1], edges[k]); the underflow and overflow bins are bounded by the extremes
+        lower = self.edges[np.clip(k - 1, 0, self.edges.size - 1)]
+        upper = self.edges[np.clip(k, 0, self.edges.size - 1)]
+        lower = np.where(k == 0, self.minimum, lower)
+        upper = np.where(k == self.histogram.size - 1, self.maximum, upper)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(self.histogram[k] > 0, (rank - before) / self.histogram[k], 0.)
+        return np.clip(lower + fraction * (upper - lower), self.minimum, self.maximum)
+
+    def fraction_above(self, threshold):
+        """Fraction of the samples above one of the thresholds"""
+        return self.above[self._threshold_index(threshold)] / self.count if self.count else np.nan
+
+    def fraction_below(self, threshold):
+        """Fraction of the samples below one of the thresholds"""
+        return self.below[self._threshold_index(threshold)] / self.count if self.count else np.nan
+
+    def _threshold_index(self, threshold):
+        index = np.flatnonzero(self.thresholds == threshold)
+        if not index.size:
+            raise KeyError("{} is not one of the thresholds {}".format(threshold, list(self.thresholds)))
+        return index[0]
+
+
+class LinkStatistics:
+    def __init__(self, step=1., thresholds=None, min_elevation=None, low=-100., high=100., bins=20000):
+        """
+        Statistics of a dynamic link run, fed chunk by chunk as the sink of ~linkbudget.dynamic.DynamicLink.run, so
+        that long multi-orbit or multi-scenario runs never keep their samples: running statistics of every result
+        quantity (see RunningStatistics), time above and below thresholds and the minimum margin of every pass
+        :float step: time between samples (s)
+        :dict thresholds: thresholds per quantity, e.g. {'link_margin': [0, 3], 'pointing_loss': [3]}
+        :float min_elevation: elevation mask of the passes (deg). If not specified, passes are the runs of samples
+                              with a margin (see the min_elevation of DynamicLink)
+        :float low: lower edge of the histograms
+        :float high: upper edge of the histograms
+        :int bins: number of bins of the histograms
+        """
+        self.step = step
+        self.thresholds = thresholds or {}
+        self.min_elevation = min_elevation
+        self._histogram = (low, high, bins)
+        self.quantities = {}
+        self.samples = 0
+        self._passes = []
+        # Start and minimum margin of a pass that is still in progress at the end of the last chunk
+        self._open = None
+
+    def __call__(self, result):
+        for key, values in result.items():
+            if key not in self.quantities:
+                self.quantities[key] = RunningStatistics(self.thresholds.get(key, ()), *self._histogram)
+            self.quantities[key].update(values)
+
+        margin = np.asarray(result['link_margin'], dtype=float)
+        if self.min_elevation is None:
+            visible = ~np.isnan(margin)
+        else:
+            visible = np.asarray(result['elev_angle']) >= self.min_elevation
+        if self._open is not None and len(visible) and not visible[0]:
+            # The pass in progress ended with the last chunk
+            self._passes.append((self._open[0], self.samples, self._open[1]))
+            self._open = None
+
+        intervals = mask_intervals(visible)
+        if len(intervals):
+            # Sentinel so that stop == n is a valid index for reduceat
+            minima = np.fmin.reduceat(np.append(margin, np.nan), intervals.ravel())[::2]
+            for (start, stop), minimum in zip(intervals, minima):
+                if start == 0 and self._open is not None:
+                    start, minimum = self._open[0] - self.samples, np.fmin(self._open[1], minimum)
+                    self._open = None
+                if stop == len(margin):
+                    self._open = (self.samples + start, minimum)
+                else:
+                    self._passes.append((self.samples + start, self.samples + stop, minimum))
+        self.samples += len(margin)
+
+    @property
+    def passes(self):
+        """dict of arrays, one entry per pass: 'aos' and 'los' ([start, stop) sample indices) and 'min_margin'"""
+        passes = list(self._passes)
+        if self._open is not None:
+            passes.append((self._open[0], self.samples, self._open[1]))
+        aos, los, min_margin = np.array(passes, dtype=float).reshape(-1, 3).T
+        return {'aos': aos.astype(int), 'los': los.astype(int), 'min_margin': min_margin}
+
+    def time_above(self, key, threshold):
+        """Time (s) during which a quantity is above one of its thresholds"""
+        statistics = self.quantities[key]
+        return statistics.above[statistics._threshold_index(threshold)] * self.step
+
+    def time_below(self, key, threshold):
+        """Time (s) during which a quantity is below one of its thresholds"""
+        statistics = self.quantities[key]
+        return statistics.below[statistics._threshold_index(threshold)] * self.step
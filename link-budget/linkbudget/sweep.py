@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from linkbudget.dynamic import DynamicLink
+from linkbudget.ephemeris import read_gmat_report
+
+
+class Scenario:
+    def __init__(self, name, link, gs_location, ephemeris, attitude=None, reduce=None, chunk_size=100000,
+                 dynamic_options=None):
+        """
+        One dynamic-link run of a scenario sweep
+        :str name: name of the scenario
+        :~linkbudget.link.Link link: link (ground station and spacecraft) of the scenario
+        :~astropy.coordinates.EarthLocation gs_location: location of the ground station
+        :ephemeris: dict of ephemeris arrays (see ~linkbudget.dynamic.DynamicLink.process), or the path to a GMAT
+                    report, which is then read by the worker
+        :~numpy.array attitude: N x 2 array of attitude errors (theta, phi) in deg
+        :callable reduce: applied to the results by the worker, so that only its output is sent back. Must be
+                          picklable (e.g. a module-level function)
+        :int chunk_size: number of samples per chunk of the pipeline
+        :dict dynamic_options: other options of the ~linkbudget.dynamic.DynamicLink of the scenario, e.g.
+                               {'min_elevation': 0, 'fold_theta': True} to reproduce the UHF dynamic link script
+        """
+        self.name = name
+        self.link = link
+        self.gs_location = gs_location
+        self.ephemeris = ephemeris
+        self.attitude = attitude
+        self.reduce = reduce
+        self.chunk_size = chunk_size
+        self.dynamic_options = {} if dynamic_options is None else dict(dynamic_options)
+
+    def run(self):
+        ephemeris = self.ephemeris
+        if isinstance(ephemeris, str):
+            ephemeris = read_gmat_report(ephemeris, ['altitude', 'latitude', 'longitude'])
+        dynamic = DynamicLink(self.link, self.gs_location, self.chunk_size, **self.dynamic_options)
+        result = dynamic.run(ephemeris, self.attitude)
+        return result if self.reduce is None else self.reduce(result)
+
+
+class ScenarioSweep:
+    # Interval (s) at which a waiting sweep checks whether it has been cancelled
+    poll_interval = 0.1
+
+    def __init__(self, scenarios, max_workers=None):
+        """
+        Runs scenarios across a pool of processes
+        :list scenarios: ~linkbudget.sweep.Scenario objects
+        :int max_workers: maximum number of worker processes (number of CPUs if not specified)
+        """
+        self.scenarios = list(scenarios)
+        self.max_workers = max_workers
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop the sweep; scenarios that haven't started are dropped. Can be called from any thread"""
+        self._cancelled.set()
+
+    def run(self):
+        """Generator of (scenario name, result) pairs, in the order the scenarios finish"""
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        try:
+            pending = {executor.submit(scenario.run): scenario.name for scenario in self.scenarios}
+            while pending and not self.cancelled:
+                done, _ = wait(pending, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = pending.pop(future)
+                    yield name, future.result()
+                    if self.cancelled:
+                        break
+        finally:
+            # Also reached when the consumer stops iterating or a scenario fails
+            executor.shutdown(wait=True, cancel_futures=True)
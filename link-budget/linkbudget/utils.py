@@ -1,6 +1,14 @@
+import os
+
 import numpy as np
 
 from astropy import units as u
+from astropy.coordinates import EarthLocation
+
+# WGS-84 ellipsoid: semi-major axis (m), flattening and first eccentricity squared
+WGS84_A = 6378137.
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
 
 
 def slant_range(sc_altitude, gs_altitude, elev_angle):
@@ -11,38 +19,143 @@ def slant_range(sc_altitude, gs_altitude, elev_angle):
     :~astropy.units.Unit gs_altitude: Altitude of ground station
     :~astropy.units.Unit elev_angle: Elevation angle with respect to the horizon (>= 0)
     """
-    r_earth = 6378.136 * u.km  # Earth's radius
-    d = -(r_earth + gs_altitude) * np.sin(elev_angle) + np.sqrt(
-        np.square(r_earth + gs_altitude) * np.square(np.sin(elev_angle)) +
+    return slant_range_km(sc_altitude.to_value(u.km), gs_altitude.to_value(u.km), elev_angle.to_value(u.deg)) * u.km
+
+
+def slant_range_km(sc_altitude, gs_altitude, elev_angle):
+    """
+    Slant-range (km) on plain floats or arrays (assuming spherical Earth)
+    :float sc_altitude: Altitude of spacecraft (km)
+    :float gs_altitude: Altitude of ground station (km)
+    :float elev_angle: Elevation angle with respect to the horizon (deg, >= 0)
+    """
+    r_earth = 6378.136  # Earth's radius (km)
+    sin_elev = np.sin(np.deg2rad(elev_angle))
+    d = -(r_earth + gs_altitude) * sin_elev + np.sqrt(
+        np.square(r_earth + gs_altitude) * np.square(sin_elev) +
         np.square(sc_altitude) - np.square(gs_altitude) +
         2 * r_earth * (sc_altitude - gs_altitude))
     return d
 
 
-def elevation_angle(sat, gs):
+def elevation_angle(sat, gs, visibility=False):
     """ Find the elevation angle of the satellite with respect to the ground station given the geodetic coordinates
-    of the satellite and ground station
-    :~astropy.coordinates.EarthLocation sat: Location of satellite
-    :~astropy.coordinates.EarthLocation gs: Location of ground station
+    of the satellite and ground station. Vector locations are evaluated in one pass.
+    :~astropy.coordinates.EarthLocation sat: Location of satellite. Can also be an N x 3 array of ECEF positions
+                                             (plain arrays are taken in m)
+    :~astropy.coordinates.EarthLocation gs: Location of ground station (or an ECEF position)
+    :bool visibility: also return whether the satellite lies above the tangential plane of the ground station
     """
     # Turns out it's way easier to do this in Cartesian coordinates
 
-    # Normalize units and convert to numpy array which makes vector operations easier
-    sat_cart = np.array(
-        [sat.x.to(u.m).value, sat.y.to(u.m).value, sat.z.to(u.m).value])  # Cartesian satellite coordinates
-    gs_cart = np.array(
-        [gs.x.to(u.m).value, gs.y.to(u.m).value, gs.z.to(u.m).value])  # Cartesian ground station coordinates
+    # Normalize units and convert to numpy arrays (... x 3) which makes vector operations easier
+    sat_cart = ecef_position(sat)  # Cartesian satellite coordinates
+    gs_cart = ecef_position(gs)  # Cartesian ground station coordinates
 
     d = sat_cart - gs_cart
 
     # Semi-major axes of the Earth ellipsoid (WGS-84)
-    a, b, c = 6378137, 6378137, 6356752.3142451793
+    a, b, c = WGS84_A, WGS84_A, WGS84_A * (1 - WGS84_F)
     # Outward-facing normal of the ellipsoid on the ground station
-    gs_normal = np.array([gs_cart[0] / a ** 2, gs_cart[1] / b ** 2, gs_cart[2] / c ** 2])
+    gs_normal = gs_cart / np.array([a ** 2, b ** 2, c ** 2])
+
+    # The satellite is visible when it lies above the tangential plane
+    n_dot_d = np.einsum('...i,...i->...', gs_normal, d)
+    cos_angle = n_dot_d / (np.linalg.norm(gs_normal, axis=-1) * np.linalg.norm(d, axis=-1))
+    elevation = (90 - np.rad2deg(np.arccos(np.clip(cos_angle, -1, 1)))) * u.deg
+
+    if visibility:
+        return elevation, n_dot_d > 0
+    return elevation
+
+
+def geodetic_to_ecef(longitude, latitude, height=0.):
+    """
+    WGS-84 geodetic coordinates to ECEF positions, on plain float arrays
+    :~numpy.array longitude: longitudes (deg). Quantities are converted
+    :~numpy.array latitude: geodetic latitudes (deg)
+    :~numpy.array height: heights above the ellipsoid (m)
+    :return: ... x 3 array of ECEF positions (m)
+    """
+    lon = np.deg2rad(to_float(longitude, u.deg))
+    lat = np.deg2rad(to_float(latitude, u.deg))
+    height = to_float(height, u.m)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    # Prime vertical radius of curvature
+    n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    x = (n + height) * cos_lat * np.cos(lon)
+    y = (n + height) * cos_lat * np.sin(lon)
+    z = (n * (1 - WGS84_E2) + height) * sin_lat
+    return np.stack(np.broadcast_arrays(x, y, z), axis=-1)
+
+
+def ecef_to_geodetic(position):
+    """
+    ECEF positions to WGS-84 geodetic coordinates, on plain float arrays (Bowring's method, iterated twice,
+    accurate to well below a millimetre from the ground to GEO)
+    :~numpy.array position: ... x 3 array of ECEF positions (m), or an EarthLocation
+    :return: longitudes (deg), geodetic latitudes (deg) and heights above the ellipsoid (m)
+    """
+    x, y, z = np.moveaxis(ecef_position(position), -1, 0)
+    b = WGS84_A * (1 - WGS84_F)
+    ep2 = WGS84_E2 / (1 - WGS84_E2)
+    p = np.hypot(x, y)
+    # Parametric latitude as the starting point, then two rounds of geodetic latitude estimate and update of the
+    # parametric latitude from it
+    beta = np.arctan2(z * WGS84_A, p * b)
+    for _ in range(2):
+        lat = np.arctan2(z + ep2 * b * np.sin(beta) ** 3, p - WGS84_E2 * WGS84_A * np.cos(beta) ** 3)
+        beta = np.arctan((1 - WGS84_F) * np.tan(lat))
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    height = p * cos_lat + z * sin_lat - WGS84_A * np.sqrt(1 - WGS84_E2 * sin_lat ** 2)
+    return np.rad2deg(np.arctan2(y, x)), np.rad2deg(lat), height
+
+
+def as_earth_location(position):
+    """Astropy adapter: EarthLocation of ... x 3 ECEF positions (m)"""
+    position = np.asarray(position, dtype=float)
+    return EarthLocation.from_geocentric(position[..., 0], position[..., 1], position[..., 2], unit=u.m)
+
+
+def mask_intervals(mask):
+    """
+    Runs of True in a boolean series, found by edge detection
+    :~numpy.array mask: 1D boolean array
+    :return: K x 2 integer array of [start, stop) sample indices
+    """
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=-1)
+
+
+def replace_file(path, write):
+    """
+    Write a file through a temporary one, so that readers never see it half-written
+    :str path: path of the file
+    :callable write: writes the contents to the binary file object it is called with
+    """
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
 
-    # Determine if the point of the satellite lies above the tangential plane
-    is_visible = 1 if np.dot(gs_normal, d) > 0 else -1
+def ecef_position(location):
+    """ECEF coordinates (in m) of an EarthLocation, a Quantity or a plain array as a ... x 3 float array"""
+    if isinstance(location, EarthLocation):
+        return np.stack([location.x.to_value(u.m), location.y.to_value(u.m), location.z.to_value(u.m)], axis=-1)
+    if isinstance(location, u.Quantity):
+        return location.to_value(u.m)
+    return np.asarray(location, dtype=float)
 
-    elevation = np.rad2deg(np.arccos(np.dot(gs_normal, d) / (np.linalg.norm(gs_normal) * np.linalg.norm(d)))) * u.deg
 
-    return 90 * u.deg - elevation if is_visible else - elevation
+def to_float(value, unit):
+    """Plain float array of a quantity in ``unit``, or of an array that is already expressed in it"""
+    if not isinstance(value, u.Quantity):
+        return np.asarray(value, dtype=float)
+    if unit == u.dB:
+        # pycraf's dB is a logarithmic unit, not convertible to the plain decibel. Only levels relative to 1 (not
+        # e.g. dB(W)) are plain dB values
+        if value.unit != u.dB and getattr(value.unit, 'physical_unit', None) != u.dimensionless_unscaled:
+            raise u.UnitConversionError("'{}' is not a dB ratio".format(value.unit))
+        return value.value
+    return value.to_value(unit)
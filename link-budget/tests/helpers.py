@@ -0,0 +1,55 @@
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from pycraf import conversions as cnv
+
+from linkbudget.antenna import Antenna, AntennaMeasured
+from linkbudget.ground_station import GroundStation
+from linkbudget.link import Downlink
+from linkbudget.receiver import DownlinkReceiver
+from linkbudget.spacecraft import Spacecraft
+from linkbudget.transmitter import DownlinkTransmitter
+
+
+def dipole_antenna():
+    """Measured antenna with a 2 cos(theta)^2 - 1 pattern, on a 1 deg grid of theta and phi in [-180, 180]"""
+    theta = np.linspace(-180, 180, 361)
+    rad_pat = 2 * np.cos(np.deg2rad(theta))[:, None] ** 2 * np.ones(theta.size) - 1
+    return AntennaMeasured(rad_pat, 1, theta, theta)
+
+
+def downlink(sc_antenna=None, gs_gain=12, power=1.6):
+    """
+    UHF downlink of the test cases
+    :~linkbudget.antenna.Antenna sc_antenna: antenna of the spacecraft (0 dB if not specified)
+    :float gs_gain: gain of the ground station antenna (dB)
+    :float power: transmitter power (W)
+    """
+    dtransmitter = DownlinkTransmitter(power * u.W, 0 * cnv.dB, 4, 0 * cnv.dB, 0.5 * cnv.dB, 0.23 * cnv.dB)
+    dreceiver = DownlinkReceiver((0.023 + 0.0276 + 0.0276) * cnv.dB, 0.8 * cnv.dB, 1.1 * cnv.dB, 4, 154 * u.K,
+                                 289 * u.K, 28 * u.K,
+                                 22.5 * cnv.dB, 0.1 * cnv.dB, 1000 * u.K)
+    ground_station = GroundStation(Antenna(gs_gain * cnv.dB), 0 * cnv.dB, dreceiver, dtransmitter, 56 * u.m)
+    spacecraft = Spacecraft(Antenna(0 * cnv.dB) if sc_antenna is None else sc_antenna, 0 * cnv.dB, dtransmitter,
+                            dtransmitter, 500 * u.km)
+    return Downlink(ground_station, spacecraft, 437.5 * u.MHz, 20 * u.deg, 4.7 * cnv.dB,
+                    10000, 1e-6, 1 * cnv.dB, 7.2 * cnv.dB)
+
+
+def gs_location(longitude=22.959887, latitude=40.627233, height=56.):
+    """Location of a ground station (Thessaloniki if not specified); height in m"""
+    return EarthLocation.from_geodetic(longitude, latitude, height * u.m)
+
+
+def pass_ephemeris(n=50):
+    """Ephemeris of a pass over Thessaloniki, rising above and setting below 10 deg of elevation"""
+    return {
+        'altitude': np.linspace(500, 520, n),
+        'latitude': np.linspace(20, 60, n),
+        'longitude': np.linspace(10, 35, n),
+    }
+
+
+def pass_attitude(n=50):
+    """Attitude errors (theta, phi) in deg along the pass"""
+    return np.stack([np.linspace(-5, 5, n), np.linspace(-30, 30, n)], axis=-1)
@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from linkbudget.adaptive import adaptive_sample, reconstruct
+
+
+class AdaptiveTestCases(unittest.TestCase):
+
+    def test_adaptive_sample(self):
+        n = 100000
+        t = np.arange(n)
+        margin = 5 * np.sin(2 * np.pi * t / n) + 2 * np.exp(-((t - 30000) / 50.) ** 2)
+        margin[60000:70000] = np.nan
+        calls = []
+
+        def evaluate(indices):
+            calls.append(len(indices))
+            return {'link_margin': margin[indices]}
+
+        indices, values = adaptive_sample(evaluate, n, 512, {'link_margin': 0.01}, {'link_margin': [1.]})
+        self.assertLess(len(indices), n / 50)
+        self.assertEqual(sum(calls), len(indices))
+        np.testing.assert_array_equal(values['link_margin'], margin[indices])
+
+        series = reconstruct(indices, values, n)['link_margin']
+        np.testing.assert_array_equal(np.isnan(series), np.isnan(margin))
+        self.assertLess(np.nanmax(np.abs(series - margin)), 0.05)
+        # Threshold crossings are resolved to the sample
+        np.testing.assert_array_equal(series > 1, margin > 1)
+
+        # Empty series: nothing is sampled
+        indices, values = adaptive_sample(evaluate, 0, 512)
+        self.assertEqual(indices.size, 0)
+        self.assertEqual(values['link_margin'].size, 0)
+        self.assertEqual(reconstruct(indices, values, 0)['link_margin'].size, 0)
+        self.assertRaises(ValueError, adaptive_sample, evaluate, -1)
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 
 import numpy as np
@@ -5,7 +7,7 @@ from astropy import units as u
 from astropy.tests.helper import assert_quantity_allclose
 from pycraf import conversions as cnv
 
-from linkbudget.antenna import AntennaMeasured, AntennaHelical, AntennaParabolicReflector
+from linkbudget.antenna import AntennaMeasured, AntennaHelical, AntennaParabolicReflector, PatternLookup
 
 
 class AntennaTestCases(unittest.TestCase):
@@ -25,6 +27,162 @@ class AntennaTestCases(unittest.TestCase):
         self.assertAlmostEqual(antenna.directivity(np.pi / 2, np.pi / 2), 0.001922, 6)
         assert_quantity_allclose(antenna.gain, 2.5465222 * cnv.dB)
 
+    def test_antenna_measured_cache(self):
+        theta = np.linspace(0, np.pi, 181)
+        phi = np.linspace(-np.pi, np.pi, 361)
+        antenna = AntennaMeasured(np.ones((181, 361)), 1, theta, phi, angle_unit='rad')
+        total_radiated_power = antenna.total_radiated_power
+        self.assertAlmostEqual(total_radiated_power, 4 * np.pi, 6)
+        self.assertIs(antenna.total_radiated_power, total_radiated_power)
+
+        # The pattern can't be modified in place, only reassigned, which invalidates the cached integrals
+        with self.assertRaises(ValueError):
+            antenna.rad_pattern[0, 0] = 2
+        antenna.rad_pattern = 2 * np.ones((181, 361))
+        self.assertAlmostEqual(antenna.total_radiated_power, 2 * total_radiated_power)
+        self.assertAlmostEqual(antenna.gain_p(0.1, 0.2), 2)
+
+        antenna.rad_pattern_theta = np.linspace(0, np.pi / 2, 181)
+        self.assertAlmostEqual(antenna.total_radiated_power, 4 * np.pi, 6)
+
+        # Nor through the array it was built from
+        rad_pat = np.ones((181, 361))
+        antenna = AntennaMeasured(rad_pat, 1, theta, phi)
+        rad_pat[:] = 2
+        self.assertAlmostEqual(antenna.gain_p(0.1, 0.2), 1)
+
+        lookup = antenna.rad_pattern_lookup
+        antenna.interpolation = 'cubic'
+        self.assertIsNot(antenna.rad_pattern_lookup, lookup)
+        self.assertEqual(antenna.rad_pattern_lookup.method, 'cubic')
+
+    def test_pattern_lookup(self):
+        f = lambda t, p: np.cos(t) * (2 + np.sin(p))
+        theta = np.linspace(-90, 90, 181)
+        phi = np.linspace(-179, 180, 360)
+        rad_pat = f(np.deg2rad(theta)[:, None], np.deg2rad(phi)[None, :])
+
+        rng = np.random.default_rng(0)
+        t = rng.uniform(-80, 80, 10000)
+        p = rng.uniform(-180, 180, 10000)
+        expected = f(np.deg2rad(t), np.deg2rad(p))
+        for method, tolerance in (('linear', 1e-3), ('cubic', 1e-6)):
+            lookup = PatternLookup(theta, phi, rad_pat, method)
+            self.assertEqual(lookup.phi_period, 360)
+            np.testing.assert_allclose(lookup(t, p), expected, atol=tolerance)
+            # phi wraps around, also across the seam between 180 and -179
+            np.testing.assert_allclose(lookup(t, p + 720), lookup(t, p), atol=1e-9)
+            np.testing.assert_allclose(lookup(10, 180.5), f(np.deg2rad(10), np.deg2rad(180.5)), atol=tolerance)
+
+        self.assertRaises(ValueError, PatternLookup, theta, phi, rad_pat, 'nearest')
+
+        # NaN angles (e.g. outside the contact windows of a dynamic run) give NaN
+        for method in ('linear', 'cubic'):
+            antenna = AntennaMeasured(rad_pat, 1, theta, phi, method)
+            self.assertTrue(np.isnan(antenna.gain_p(np.nan, 0)))
+            gain = antenna.gain_p([10, np.nan, 20], [0, 0, np.nan])
+            self.assertTrue(np.isfinite(gain[0]) and np.all(np.isnan(gain[1:])))
+
+        # The unit of the angles comes from the antenna, not from the span of the grid: a narrow cut in degrees
+        # doesn't wrap around as if it were a whole circle in radians
+        cut = AntennaMeasured(rad_pat[:, :7], 1, theta, np.linspace(0, 6, 7))
+        self.assertEqual(cut.rad_pattern_lookup.phi_period, 360)
+        self.assertFalse(cut.rad_pattern_lookup.periodic)
+        self.assertAlmostEqual(cut.gain_p(10, 6.2), cut.gain_p(10, 6))
+        self.assertEqual(AntennaMeasured(rad_pat, 1).rad_pattern_lookup.phi_period, 2 * np.pi)
+        self.assertRaises(ValueError, AntennaMeasured, rad_pat, 1, theta, phi, angle_unit='grad')
+
+    def test_antenna_from_farfield(self):
+        theta = np.arange(-90, 91, 5.)
+        phi = np.arange(-175, 181, 5.)
+        rad_pat = np.cos(np.deg2rad(theta))[:, None] * (2 + np.sin(np.deg2rad(phi)))[None, :]
+        t, p = np.meshgrid(theta, phi, indexing='ij')
+        rows = np.stack([t.ravel(), p.ravel(), rad_pat.ravel(), np.zeros(t.size)], axis=-1)
+        rows = rows[np.random.default_rng(0).permutation(len(rows))]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'farfield.txt')
+            with open(path, 'w') as f:
+                f.write('Theta [deg.]  Phi   [deg.]  Abs(Dir.)[dBi  ]   Phase [deg.]\n')
+                f.write('-' * 60 + '\n')
+                np.savetxt(f, rows)
+            antenna = AntennaMeasured.from_farfield(path)
+            np.testing.assert_array_equal(antenna.rad_pattern_theta, theta)
+            np.testing.assert_array_equal(antenna.rad_pattern_phi, phi)
+            np.testing.assert_allclose(antenna.rad_pattern, rad_pat)
+
+            # Parsed once, then served from the cache until the file changes
+            cache = os.listdir(os.path.join(directory, '.cache'))
+            self.assertEqual(len(cache), 1)
+            np.testing.assert_allclose(AntennaMeasured.from_farfield(path).rad_pattern, rad_pat)
+            self.assertEqual(os.listdir(os.path.join(directory, '.cache')), cache)
+
+            with open(path, 'w') as f:
+                np.savetxt(f, rows[1:])
+            self.assertRaises(ValueError, AntennaMeasured.from_farfield, path)
+            antenna = AntennaMeasured.from_farfield(path, fill=-7)
+            self.assertEqual(np.count_nonzero(antenna.rad_pattern == -7), 1)
+
+            # Neither an empty file nor one without numeric rows is an export
+            for contents in ('', 'Theta [deg.]  Phi [deg.]  Abs(Dir.)[dBi]\n'):
+                with open(path, 'w') as f:
+                    f.write(contents)
+                self.assertRaises(ValueError, AntennaMeasured.from_farfield, path)
+
+    def test_antenna_from_grid(self):
+        directivity = np.arange(12.).reshape(3, 4)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'directivity.txt')
+            np.savetxt(path, directivity.ravel())
+            antenna = AntennaMeasured.from_grid(path, (3, 4), 0.7, cache_dir=os.path.join(directory, 'cache'))
+            np.testing.assert_array_equal(antenna.rad_pattern, directivity)
+            self.assertEqual(antenna.antenna_e, 0.7)
+            self.assertEqual(len(os.listdir(os.path.join(directory, 'cache'))), 1)
+            self.assertRaises(ValueError, AntennaMeasured.from_grid, path, (4, 4))
+
+            # A truncated cache entry is parsed again and replaced
+            cache, = os.listdir(os.path.join(directory, 'cache'))
+            cache = os.path.join(directory, 'cache', cache)
+            for size in (0, 10, os.path.getsize(cache) // 2):
+                with open(cache, 'r+b') as f:
+                    f.truncate(size)
+                antenna = AntennaMeasured.from_grid(path, (3, 4), cache_dir=os.path.join(directory, 'cache'))
+                np.testing.assert_array_equal(antenna.rad_pattern, directivity)
+                self.assertGreater(os.path.getsize(cache), size)
+
+    def test_antenna_measured_transforms(self):
+        # Hemisphere embedded in the whole sphere, as the scripts did cell by cell
+        theta = np.linspace(-90, 90, 181)
+        directivity = np.cos(np.deg2rad(theta))[:, None] * np.cos(np.deg2rad(theta))[None, :] - 3
+        antenna = AntennaMeasured(directivity, 0.7, theta, theta)
+        grid = np.linspace(-180, 180, 361)
+        padded = antenna.pad(grid, grid, -7)
+        expected = np.full((361, 361), -7.)
+        expected[90:271, 90:271] = directivity
+        np.testing.assert_allclose(padded.rad_pattern, expected)
+        self.assertEqual(padded.antenna_e, 0.7)
+
+        resampled = antenna.resample(np.linspace(-90, 90, 19), np.linspace(-90, 90, 37))
+        self.assertEqual(resampled.rad_pattern.shape, (19, 37))
+        np.testing.assert_allclose(resampled.rad_pattern, directivity[::10, ::5])
+
+        mirrored = AntennaMeasured(directivity[90:], 1, theta[90:], theta).mirror()
+        np.testing.assert_allclose(mirrored.rad_pattern_theta, theta)
+        np.testing.assert_allclose(mirrored.rad_pattern, directivity)
+        mirrored = AntennaMeasured(directivity[:, 90:], 1, theta, theta[90:]).mirror('phi')
+        np.testing.assert_allclose(mirrored.rad_pattern, directivity)
+        self.assertRaises(ValueError, antenna.mirror, 'psi')
+
+        # Pattern along the boresight, rotated by 90 deg about y: boresight moves from z to x
+        theta = np.linspace(0, 180, 181)
+        phi = np.linspace(-180, 180, 361)
+        antenna = AntennaMeasured(np.cos(np.deg2rad(theta))[:, None] * np.ones(phi.size), 1, theta, phi)
+        rotation = np.array([[0, 0, 1], [0, 1, 0], [-1, 0, 0]])
+        rotated = antenna.rotate(rotation)
+        t, p = np.deg2rad(theta)[:, None], np.deg2rad(phi)[None, :]
+        np.testing.assert_allclose(rotated.rad_pattern, np.sin(t) * np.cos(p), atol=1e-4)
+        np.testing.assert_allclose(antenna.rotate(np.eye(3)).rad_pattern, antenna.rad_pattern, atol=1e-12)
+
     def test_antenna_helical(self):
         antenna = AntennaHelical(0.1249 * u.m, 10, (0.25 * 0.1249) * u.m, 0.1249 * u.m)
 
@@ -0,0 +1,43 @@
+import unittest
+
+import numpy as np
+
+from helpers import downlink, gs_location
+from linkbudget.constellation import Constellation
+from linkbudget.network import GroundStationNetwork
+
+
+class ConstellationTestCases(unittest.TestCase):
+
+    def setUp(self):
+        locations = {'thessaloniki': gs_location(), 'kiruna': gs_location(20.96, 67.86, 400)}
+        self.spacecraft = {}
+        for name, power, longitude, n in (('sat-1', 1.6, 22., 300), ('sat-2', 0.8, 30., 200)):
+            stations = {station: (downlink(power=power), location) for station, location in locations.items()}
+            ephemeris = {'altitude': np.full(n, 500.), 'latitude': np.linspace(10, 85, n),
+                         'longitude': np.full(n, longitude)}
+            self.spacecraft[name] = (stations, ephemeris, None)
+
+    def test_constellation(self):
+        constellation = Constellation(self.spacecraft, chunk_size=50, min_elevation=5, max_workers=1)
+        self.assertEqual(constellation.stations, ['thessaloniki', 'kiruna'])
+        result = constellation.run()
+        self.assertEqual(result['link_margin'].shape, (2, 2, 300))
+        self.assertEqual(result['visible'].dtype, bool)
+
+        for i, (stations, ephemeris, attitude) in enumerate(self.spacecraft.values()):
+            expected = GroundStationNetwork(stations, min_elevation=5).run(ephemeris, attitude)
+            n = len(ephemeris['altitude'])
+            np.testing.assert_allclose(result['link_margin'][i, :, :n], expected['link_margin'].T)
+            np.testing.assert_array_equal(result['visible'][i, :, :n], expected['elev_angle'].T >= 5)
+        self.assertTrue(np.all(np.isnan(result['link_margin'][1, :, 200:])))
+        self.assertFalse(np.any(result['visible'][1, :, 200:]))
+        np.testing.assert_array_equal(result['visible'], ~np.isnan(result['link_margin']))
+
+        # Same results from the worker processes
+        constellation.max_workers = 2
+        np.testing.assert_array_equal(constellation.run()['link_margin'], result['link_margin'])
+
+        stations = dict(list(self.spacecraft['sat-2'][0].items())[:1])
+        self.assertRaises(ValueError, Constellation, {'sat-1': self.spacecraft['sat-1'],
+                                                      'sat-2': (stations, {}, None)})
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from linkbudget.data_volume import achievable_rate, pass_data_volume, daily_data_volume
+from linkbudget.passes import find_passes
+
+
+class DataVolumeTestCases(unittest.TestCase):
+
+    def test_achievable_rate(self):
+        margin = np.array([np.nan, -1., 0., 2.9, 3.1, 7., 12.])
+        np.testing.assert_array_equal(achievable_rate(margin, 9600), [0, 0, 9600, 9600, 9600, 9600, 9600])
+        np.testing.assert_array_equal(achievable_rate(margin, 9600, min_margin=3), [0, 0, 0, 0, 9600, 9600, 9600])
+
+        # Doubling the rate costs 3.01 dB of margin
+        rates = [19200, 9600, 38400, 96000]
+        np.testing.assert_array_equal(achievable_rate(margin, 9600, rates),
+                                      [0, 0, 9600, 9600, 19200, 38400, 96000])
+
+    def test_pass_data_volume(self):
+        margin = np.full(100, np.nan)
+        margin[10:30] = 5.
+        margin[40:45] = -1.
+        margin[60:80] = np.linspace(-2, 8, 20)
+        volume = pass_data_volume(margin, 0.5, 1000)
+        np.testing.assert_array_equal(volume['aos'], [10, 40, 60])
+        np.testing.assert_array_equal(volume['los'], [30, 45, 80])
+        np.testing.assert_allclose(volume['volume'], [20 * 0.5 * 1000, 0, np.sum(margin[60:80] >= 0) * 500])
+        np.testing.assert_allclose(volume['mean_rate'], [1000, 0, 1000])
+
+        adaptive = pass_data_volume(margin, 0.5, 1000, rates=[1000, 2000, 4000], min_margin=1)
+        rate = achievable_rate(margin, 1000, [1000, 2000, 4000], 1)
+        np.testing.assert_allclose(adaptive['volume'], [2000 * 10, 0, np.sum(rate[60:80]) * 0.5])
+        self.assertGreater(adaptive['volume'][2], 0)
+
+        # Passes from the elevation
+        elev_angle = np.where(np.isnan(margin), -5., 30.)
+        volume = pass_data_volume(margin, 0.5, 1000, passes=find_passes(elev_angle, 10))
+        np.testing.assert_array_equal(volume['aos'], [10, 40, 60])
+
+    def test_daily_data_volume(self):
+        rate = np.ones(48)
+        np.testing.assert_allclose(daily_data_volume(rate, 3600), [86400, 86400])
+        np.testing.assert_allclose(daily_data_volume(rate, 3600, offset=12 * 3600), [43200, 86400, 43200])
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from astropy import units as u
+from pycraf import conversions as cnv
+
+from linkbudget.antenna import Antenna
+from linkbudget.design_space import DesignSpace, parameter_aliases
+from linkbudget.ground_station import GroundStation
+from linkbudget.link import Downlink, Uplink
+from linkbudget.receiver import DownlinkReceiver, UplinkReceiver
+from linkbudget.spacecraft import Spacecraft
+from linkbudget.transmitter import DownlinkTransmitter, UplinkTransmitter
+
+
+class DesignSpaceTestCases(unittest.TestCase):
+
+    def setUp(self):
+        utransmitter = UplinkTransmitter(13 * u.W, .155 * cnv.dB, 4, 1 * cnv.dB, .7 * cnv.dB, 0 * cnv.dB)
+        dreceiver = DownlinkReceiver((0.23 + 0.0276 + 0.0276) * cnv.dB, 1.5 * cnv.dB, 0 * cnv.dB, 4, 154 * u.K,
+                                     290 * u.K, 28 * u.K,
+                                     22.5 * cnv.dB, 0.1 * cnv.dB, 1000 * u.K)
+        self.ground_station = GroundStation(Antenna(12 * cnv.dB), 0 * cnv.dB, dreceiver, utransmitter, 50 * u.m)
+        dtransmitter = DownlinkTransmitter(1.3 * u.W, 0 * cnv.dB, 4, 0 * cnv.dB, 0.5 * cnv.dB, 0.23 * cnv.dB)
+        ureceiver = UplinkReceiver((0.08 + 0.04 + 0.04) * cnv.dB, 0.7 * cnv.dB, 0.5 * cnv.dB, 2, 280 * u.K,
+                                   280 * u.K, 28 * u.K,
+                                   20 * cnv.dB, 0 * u.K)
+        self.spacecraft = Spacecraft(Antenna(-1.3 * cnv.dB), 0 * cnv.dB, ureceiver, dtransmitter, 380 * u.km)
+        self.dlink = Downlink(self.ground_station, self.spacecraft, 437 * u.MHz, 30 * u.deg, 3.4 * cnv.dB,
+                              20000, 1e-6, 1 * cnv.dB, 8 * cnv.dB)
+        self.axes = {
+            'frequency': [435, 437, 2400] * u.MHz,
+            'power': [0, 1.1, 3] * cnv.dB_W,
+            'gs_antenna_gain': [12, 15] * cnv.dB,
+            'bit_rate': [9600, 20000],
+            'elevation': np.array([10., 30., 60., 90.]),
+        }
+
+    def test_design_space(self):
+        space = DesignSpace(self.dlink, self.axes)
+        self.assertEqual(space.shape, (3, 3, 2, 2, 4))
+        self.assertEqual(space.dims, ('frequency', 'power', 'gs_antenna_gain', 'bit_rate', 'elevation'))
+        cube = space.margin()
+        self.assertEqual(cube.shape, space.shape)
+
+        # Same as building one link per point
+        for index in [(0, 0, 0, 0, 0), (2, 1, 1, 0, 3), (1, 2, 0, 1, 2)]:
+            transmitter = DownlinkTransmitter(1.3 * u.W, 0 * cnv.dB, 4, 0 * cnv.dB, 0.5 * cnv.dB, 0.23 * cnv.dB)
+            transmitter.power_output = self.axes['power'][index[1]]
+            ground_station = GroundStation(Antenna(self.axes['gs_antenna_gain'][index[2]]), 0 * cnv.dB,
+                                           self.ground_station.gs_receiver, self.ground_station.gs_transmitter,
+                                           50 * u.m)
+            spacecraft = Spacecraft(Antenna(-1.3 * cnv.dB), 0 * cnv.dB, self.spacecraft.sc_receiver, transmitter,
+                                    380 * u.km)
+            link = Downlink(ground_station, spacecraft, self.axes['frequency'][index[0]],
+                            self.axes['elevation'][index[4]] * u.deg, 3.4 * cnv.dB, self.axes['bit_rate'][index[3]],
+                            1e-6, 1 * cnv.dB, 8 * cnv.dB)
+            self.assertAlmostEqual(cube[index], link.link_margin.value, 9)
+
+        # Lazy selections and chunks
+        np.testing.assert_allclose(space[1, :, 0], cube[1, :, 0])
+        np.testing.assert_allclose(space[[0, 2], 1:], cube[[0, 2], 1:])
+        space.chunk_size = 10
+        blocks = list(space.chunks())
+        self.assertTrue(all(block.size <= 10 for _, block in blocks))
+        self.assertEqual(sum(block.size for _, block in blocks), space.size)
+        with tempfile.TemporaryDirectory() as directory:
+            out = np.lib.format.open_memmap(os.path.join(directory, 'cube.npy'), 'w+', float, space.shape)
+            np.testing.assert_allclose(space.margin(out), cube)
+            del out
+
+        self.assertRaises(IndexError, space.__getitem__, (0,) * 6)
+        self.assertRaises(AttributeError, DesignSpace, self.dlink, {'lna_temperature': [28]})
+        self.assertRaises(ValueError, DesignSpace, self.dlink, {})
+
+    def test_design_space_paths(self):
+        ulink = Uplink(self.ground_station, self.spacecraft, 437 * u.MHz, 30 * u.deg, 3.4 * cnv.dB, 20000, 1e-6,
+                       1 * cnv.dB, 8 * cnv.dB)
+        self.assertEqual(parameter_aliases(ulink)['power'], 'ground_station.gs_transmitter.power_output')
+        space = DesignSpace(ulink, {'power': [10, 13] * u.W,
+                                    'spacecraft.sc_receiver.lna_temperature': [28, 56, 112]})
+        cube = space.margin()
+        self.assertEqual(cube.shape, (2, 3))
+        self.assertAlmostEqual(cube[1, 0], ulink.link_margin.value, 9)
+        self.assertAlmostEqual(cube[1, 0] - cube[0, 0], 10 * np.log10(1.3), 9)
@@ -0,0 +1,158 @@
+import unittest
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from pycraf import conversions as cnv
+
+from helpers import dipole_antenna, downlink, gs_location, pass_attitude, pass_ephemeris
+from linkbudget.adaptive import reconstruct
+from linkbudget.antenna import AntennaMeasured
+from linkbudget.dynamic import DynamicLink, off_nadir_angle
+from linkbudget.ephemeris import PeriodicEphemeris
+from linkbudget.utils import elevation_angle
+
+
+class DynamicTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.sc_antenna = dipole_antenna()
+        self.dlink = downlink(self.sc_antenna)
+        self.spacecraft = self.dlink.spacecraft
+        self.gs_coo = gs_location()
+        self.ephemeris = pass_ephemeris()
+        self.attitude = pass_attitude()
+
+    def test_off_nadir_angle(self):
+        self.assertAlmostEqual(off_nadir_angle(90, 500), 0)
+        self.assertAlmostEqual(off_nadir_angle(0, 500), np.rad2deg(np.arcsin(6378.136 / 6878.136)))
+
+    def test_dynamic_link(self):
+        result = DynamicLink(self.dlink, self.gs_coo, chunk_size=7).run(self.ephemeris, self.attitude)
+        self.assertEqual(result['link_margin'].shape, (50,))
+
+        # Same as the sample-by-sample evaluation of the scripts
+        G = np.max(self.sc_antenna.rad_pattern)
+        for i in (0, 13, 49):
+            sat_coo = EarthLocation.from_geodetic(self.ephemeris['longitude'][i], self.ephemeris['latitude'][i],
+                                                  self.ephemeris['altitude'][i] * 1000)
+            self.dlink.elev_angle = elevation_angle(sat_coo, self.gs_coo)
+            self.spacecraft.sc_altitude = self.ephemeris['altitude'][i] * u.km
+            theta = off_nadir_angle(self.dlink.elev_angle.value, self.ephemeris['altitude'][i]) + self.attitude[i, 0]
+            self.spacecraft.pointing_loss = (G - self.sc_antenna.gain_p(theta, self.attitude[i, 1])) * cnv.dB
+            self.assertAlmostEqual(result['elev_angle'][i], self.dlink.elev_angle.value)
+            self.assertAlmostEqual(result['pointing_loss'][i], self.spacecraft.pointing_loss.value)
+            self.assertAlmostEqual(result['link_margin'][i], self.dlink.link_margin.value)
+
+    def test_dynamic_link_fold_theta(self):
+        # Pattern measured over theta in [-90, 90] only, as in the UHF script
+        theta = np.linspace(-90, 90, 181)
+        phi = np.linspace(-179, 180, 360)
+        sc_antenna = AntennaMeasured(2 + theta[:, None] / 90 + np.cos(np.deg2rad(phi)), 1, theta, phi)
+        self.spacecraft.sc_antenna = sc_antenna
+        attitude = self.attitude.copy()
+        attitude[::2, 0] = 60
+        attitude[1::4, 0] = -170
+        result = DynamicLink(self.dlink, self.gs_coo, fold_theta=True).run(self.ephemeris, attitude)
+
+        # Same as the sample-by-sample loop of the UHF script
+        G = np.max(sc_antenna.rad_pattern)
+        theta_sc = off_nadir_angle(result['elev_angle'], self.ephemeris['altitude']) + attitude[:, 0]
+        self.assertTrue(np.any(theta_sc > 90) and np.any(theta_sc < -90))
+        for i in range(len(theta_sc)):
+            if theta_sc[i] > 90:
+                theta_sc[i] = 180 - theta_sc[i]
+            if theta_sc[i] < -90:
+                theta_sc[i] = 180 + theta_sc[i]
+            self.assertAlmostEqual(result['theta'][i], theta_sc[i])
+            self.assertAlmostEqual(result['pointing_loss'][i], G - sc_antenna.gain_p(theta_sc[i], attitude[i, 1]))
+
+        # Without folding, the angles beyond the pattern are clamped to its edges
+        clamped = DynamicLink(self.dlink, self.gs_coo).run(self.ephemeris, attitude)
+        self.assertFalse(np.allclose(clamped['pointing_loss'], result['pointing_loss']))
+
+    def test_dynamic_link_radians(self):
+        # Pattern on the default grids, in radians: the angles of the pipeline (deg) are converted for the lookup
+        theta = np.linspace(-np.pi / 2, np.pi / 2, 181)
+        sc_antenna = AntennaMeasured(2 + np.sin(theta)[:, None] * np.ones(361), 1)
+        self.assertEqual(sc_antenna.angle_unit, 'rad')
+        self.spacecraft.sc_antenna = sc_antenna
+        result = DynamicLink(self.dlink, self.gs_coo).run(self.ephemeris, self.attitude)
+        np.testing.assert_allclose(result['gain'], 2 + np.sin(np.deg2rad(result['theta'])), atol=1e-3)
+        self.assertGreater(np.ptp(result['pointing_loss']), 0.5)
+
+    def test_dynamic_link_min_elevation(self):
+        expected = DynamicLink(self.dlink, self.gs_coo).run(self.ephemeris, self.attitude)
+        result = DynamicLink(self.dlink, self.gs_coo, min_elevation=10).run(self.ephemeris, self.attitude)
+        visible = expected['elev_angle'] >= 10
+        self.assertTrue(visible.any() and not visible.all())
+        np.testing.assert_array_equal(result['elev_angle'], expected['elev_angle'])
+        for key in ('theta', 'gain', 'pointing_loss', 'link_margin'):
+            np.testing.assert_allclose(result[key][visible], expected[key][visible])
+            self.assertTrue(np.isnan(result[key][~visible]).all())
+
+    def test_dynamic_link_adaptive(self):
+        n = 2000
+        ephemeris = {
+            'altitude': np.linspace(500, 520, n),
+            'latitude': np.linspace(20, 60, n),
+            'longitude': np.linspace(10, 35, n),
+        }
+        attitude = np.zeros((n, 2))
+        attitude[1200:1210, 0] = 20
+        dynamic = DynamicLink(self.dlink, self.gs_coo, min_elevation=10)
+        expected = dynamic.run(ephemeris, attitude)
+        indices, values = dynamic.run_adaptive(ephemeris, attitude, max_step=64, margin_tolerance=0.05,
+                                               pointing_tolerance=0.05)
+        self.assertLess(len(indices), n / 4)
+        series = reconstruct(indices, values, n)
+        for key in ('link_margin', 'pointing_loss'):
+            np.testing.assert_array_equal(np.isnan(series[key]), np.isnan(expected[key]))
+            self.assertLess(np.nanmax(np.abs(series[key] - expected[key])), 0.1)
+
+        # Without an elevation mask, AOS/LOS are still resolved to the sample on the horizon
+        dynamic = DynamicLink(self.dlink, self.gs_coo)
+        expected = dynamic.run(ephemeris)
+        self.assertTrue(np.any(expected['elev_angle'] < 0) and np.any(expected['elev_angle'] > 0))
+        indices, values = dynamic.run_adaptive(ephemeris, max_step=256, margin_tolerance=5, pointing_tolerance=5)
+        series = reconstruct(indices, values, n)
+        np.testing.assert_array_equal(series['elev_angle'] >= 0, expected['elev_angle'] >= 0)
+
+    def test_dynamic_link_chunks(self):
+        expected = DynamicLink(self.dlink, self.gs_coo).run(self.ephemeris, self.attitude)
+
+        blocks = []
+        DynamicLink(self.dlink, self.gs_coo, chunk_size=16).run(self.ephemeris, self.attitude, sink=blocks.append)
+        self.assertEqual([len(block['link_margin']) for block in blocks], [16, 16, 16, 2])
+
+        ephemeris_blocks = ({key: value[i:i + 20] for key, value in self.ephemeris.items()} for i in range(0, 50, 20))
+        result = DynamicLink(self.dlink, self.gs_coo).run(ephemeris_blocks, self.attitude)
+        for key in expected:
+            np.testing.assert_allclose(np.concatenate([block[key] for block in blocks]), expected[key])
+            np.testing.assert_allclose(result[key], expected[key])
+
+        self.assertRaises(ValueError, DynamicLink(self.dlink, self.gs_coo).run, self.ephemeris, self.attitude[:10])
+
+        # The link is compiled once per run, not once per chunk
+        compiled = []
+        compile_link = self.dlink.compile
+        self.dlink.compile = lambda: compiled.append(1) or compile_link()
+        DynamicLink(self.dlink, self.gs_coo, chunk_size=16).run(self.ephemeris, self.attitude)
+        self.assertEqual(len(compiled), 1)
+
+    def test_dynamic_link_periodic_ephemeris(self):
+        # Report every 10 samples, repeated twice: same as the tiled and interpolated arrays
+        report = {key: value[::10] for key, value in self.ephemeris.items()}
+        ephemeris = PeriodicEphemeris(report, 1, 100, report_step=10, method='linear')
+        attitude = np.tile(self.attitude, (2, 1))
+        result = DynamicLink(self.dlink, self.gs_coo, chunk_size=16).run(ephemeris, attitude)
+        self.assertEqual(result['link_margin'].shape, (100,))
+
+        tiled = {key: np.tile(ephemeris[key][:50], 2) for key in ephemeris}
+        np.testing.assert_allclose(tiled['altitude'][:41], self.ephemeris['altitude'][:41])
+        expected = DynamicLink(self.dlink, self.gs_coo).run(tiled, attitude)
+        for key in expected:
+            np.testing.assert_allclose(result[key], expected[key])
+
+        indices, values = DynamicLink(self.dlink, self.gs_coo).run_adaptive(ephemeris, attitude, max_step=8)
+        np.testing.assert_allclose(values['link_margin'], expected['link_margin'][indices])
@@ -0,0 +1,32 @@
+import unittest
+
+import numpy as np
+
+from linkbudget.eclipse import eclipse_mask
+
+
+class EclipseTestCases(unittest.TestCase):
+
+    def test_eclipse_mask(self):
+        eclipse = np.array([[0, 0, 1, 2, 1, 0, 0, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0]])
+        valid, intervals = eclipse_mask(eclipse, 3)
+        # Settling after the exits at 5, 11 (overlapping the eclipse at 13) and 14
+        expected = np.array([1, 1, 0, 0, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0], dtype=bool)
+        np.testing.assert_array_equal(valid, expected)
+        np.testing.assert_array_equal(intervals, [[0, 2], [8, 10]])
+
+        valid, intervals = eclipse_mask(np.zeros(5), 3)
+        self.assertTrue(valid.all())
+        np.testing.assert_array_equal(intervals, [[0, 5]])
+
+    def test_eclipse_mask_long(self):
+        rng = np.random.default_rng(0)
+        eclipse = np.repeat(rng.integers(0, 2, 2000), rng.integers(1, 50, 2000))
+        valid, intervals = eclipse_mask(eclipse, 40)
+
+        expected = eclipse == 0
+        for j in range(1, eclipse.size):
+            if eclipse[j - 1] != 0 and eclipse[j] == 0:
+                expected[j:j + 40] = False
+        np.testing.assert_array_equal(valid, expected)
+        self.assertEqual(sum(stop - start for start, stop in intervals), valid.sum())
@@ -0,0 +1,60 @@
+import os
+import unittest
+
+import numpy as np
+
+from linkbudget.ephemeris import read_gmat_report, iter_gmat_report, PeriodicEphemeris
+
+REPORT = os.path.join(os.path.dirname(__file__), 'gmatReport.txt')
+
+
+class EphemerisTestCases(unittest.TestCase):
+
+    def test_read_gmat_report(self):
+        report = read_gmat_report(REPORT)
+        self.assertEqual(list(report), ['epoch', 'altitude', 'latitude', 'longitude'])
+        self.assertEqual(report['epoch'][0], np.datetime64('2000-01-01T11:59:28'))
+        np.testing.assert_array_equal(np.diff(report['epoch']), np.timedelta64(10, 's'))
+        np.testing.assert_allclose(report['altitude'][[0, -1]], [500., 500.0493827156048])
+        np.testing.assert_allclose(report['longitude'][1], -111.9876543210)
+
+        report = read_gmat_report(REPORT, ['latitude'])
+        self.assertEqual(list(report), ['latitude'])
+        self.assertEqual(report['latitude'].shape, (5,))
+        self.assertRaises(KeyError, read_gmat_report, REPORT, ['x'])
+
+    def test_iter_gmat_report(self):
+        report = read_gmat_report(REPORT)
+        blocks = list(iter_gmat_report(REPORT, chunk_size=2))
+        self.assertEqual([len(block['altitude']) for block in blocks], [2, 2, 1])
+        for key in report:
+            np.testing.assert_array_equal(np.concatenate([block[key] for block in blocks]), report[key])
+
+    def test_periodic_ephemeris(self):
+        # Report step from the epochs, nodes are reproduced exactly by every method
+        report = read_gmat_report(REPORT)
+        for method in ('hermite', 'lagrange', 'linear'):
+            ephemeris = PeriodicEphemeris(report, 0.1, 1000, method=method)
+            self.assertEqual(ephemeris.period, 50)
+            self.assertEqual(list(ephemeris), ['altitude', 'latitude', 'longitude'])
+            np.testing.assert_allclose(ephemeris['altitude'][::100], np.tile(report['altitude'], 2))
+            np.testing.assert_allclose(ephemeris['longitude'][[0, -900]], report['longitude'][[0, 1]])
+        self.assertEqual(len(ephemeris['latitude']), 1000)
+        self.assertRaises(IndexError, ephemeris['latitude'].__getitem__, [1000])
+        self.assertRaises(KeyError, ephemeris.__getitem__, 'epoch')
+        self.assertRaises(ValueError, PeriodicEphemeris, report, 0.1, 10, method='spline')
+
+        # Smooth periodic orbit, sampled every 10 s and interpolated to 0.1 s
+        t = np.arange(60) * 10.
+        report = {'altitude': 500 + 10 * np.sin(2 * np.pi * t / 600),
+                  'longitude': np.mod(t * 0.6 + 180, 360) - 180}
+        time = np.arange(12000) * 0.1 + 5
+        for method, tolerance in (('hermite', 1e-3), ('lagrange', 1e-3), ('linear', 2e-2)):
+            ephemeris = PeriodicEphemeris(report, 0.1, 12000, report_step=10, offset=5, method=method)
+            np.testing.assert_allclose(ephemeris['altitude'][:], 500 + 10 * np.sin(2 * np.pi * time / 600),
+                                       atol=tolerance)
+            np.testing.assert_allclose(ephemeris['longitude'][6000:], ephemeris['longitude'][:6000])
+            # Longitude is interpolated across the date line (at 300 s)
+            np.testing.assert_allclose(ephemeris['longitude'][2948:2953], [179.88, 179.94, -180, -179.94, -179.88],
+                                       atol=1e-9)
+        self.assertRaises(ValueError, PeriodicEphemeris, report, 0.1, 10)
@@ -1,5 +1,7 @@
 import unittest
 
+import numpy as np
+
 from astropy import units as u
 from astropy.tests.helper import assert_quantity_allclose
 from pycraf import conversions as cnv
@@ -71,3 +73,70 @@ class LinkTestCases(unittest.TestCase):
 
     def test_polarization_loss(self):
         assert_quantity_allclose(Link.polarization_loss(1.4125, 1.4125, 1.5707 * u.rad), 0.508 * u.dB, rtol=1e-2)
+
+    def test_link_margin_series(self):
+        gs_antenna = Antenna(12 * cnv.dB)
+        utransmitter = UplinkTransmitter(13 * u.W, .155 * cnv.dB, 4, 1 * cnv.dB, .7 * cnv.dB, 0 * cnv.dB)
+        dreceiver = DownlinkReceiver((0.23 + 0.0276 + 0.0276) * cnv.dB, 1.5 * cnv.dB, 0 * cnv.dB, 4, 154 * u.K,
+                                     290 * u.K, 28 * u.K,
+                                     22.5 * cnv.dB, 0.1 * cnv.dB, 1000 * u.K)
+        ground_station = GroundStation(gs_antenna, 0 * cnv.dB, dreceiver, utransmitter, 50 * u.m)
+        sc_antenna = Antenna(-1.3 * cnv.dB)
+        dtransmitter = DownlinkTransmitter(1.3 * u.W, 0 * cnv.dB, 4, 0 * cnv.dB, 0.5 * cnv.dB, 0.23 * cnv.dB)
+        ureceiver = UplinkReceiver((0.08 + 0.04 + 0.04) * cnv.dB, 0.7 * cnv.dB, 0.5 * cnv.dB, 2, 280 * u.K,
+                                   280 * u.K, 28 * u.K,
+                                   20 * cnv.dB, 0 * u.K)
+        spacecraft = Spacecraft(sc_antenna, 0 * cnv.dB, ureceiver, dtransmitter, 380 * u.km)
+
+        elev_angle = np.array([5., 30., 60., 90.])
+        sc_altitude = np.array([380., 400., 450., 500.])
+        pointing_loss = np.array([0., 1., 2.5, 3.])
+        for link_cls in (Downlink, Uplink):
+            link = link_cls(ground_station, spacecraft, 437 * u.MHz, 30 * u.deg, 3.4 * cnv.dB,
+                            20000, 1e-6, 1 * cnv.dB, 8 * cnv.dB)
+            margins = link.link_margin_series(elev_angle, sc_altitude, pointing_loss)
+            self.assertEqual(margins.shape, elev_angle.shape)
+            for i in range(len(elev_angle)):
+                link.elev_angle = elev_angle[i] * u.deg
+                spacecraft.sc_altitude = sc_altitude[i] * u.km
+                spacecraft.pointing_loss = pointing_loss[i] * cnv.dB
+                self.assertAlmostEqual(margins[i].value, link.link_margin.value, 9)
+            spacecraft.sc_altitude = 380 * u.km
+            spacecraft.pointing_loss = 0 * u.dB
+
+            # Compiled plan on plain floats
+            plan = link.compile()
+            np.testing.assert_allclose(plan.link_margin(elev_angle, sc_altitude, pointing_loss), margins.value)
+            np.testing.assert_allclose(plan.link_margin(elev_angle * u.deg, sc_altitude * 1000 * u.m,
+                                                        pointing_loss * cnv.dB), margins.value)
+            # Levels of a physical unit aren't losses
+            self.assertRaises(u.UnitConversionError, plan.link_margin, elev_angle, sc_altitude,
+                              pointing_loss * cnv.dB_W)
+
+    def test_with_parameters(self):
+        gs_antenna = Antenna(12 * cnv.dB)
+        utransmitter = UplinkTransmitter(13 * u.W, .155 * cnv.dB, 4, 1 * cnv.dB, .7 * cnv.dB, 0 * cnv.dB)
+        dreceiver = DownlinkReceiver((0.23 + 0.0276 + 0.0276) * cnv.dB, 1.5 * cnv.dB, 0 * cnv.dB, 4, 154 * u.K,
+                                     290 * u.K, 28 * u.K,
+                                     22.5 * cnv.dB, 0.1 * cnv.dB, 1000 * u.K)
+        ground_station = GroundStation(gs_antenna, 0 * cnv.dB, dreceiver, utransmitter, 50 * u.m)
+        dtransmitter = DownlinkTransmitter(1.3 * u.W, 0 * cnv.dB, 4, 0 * cnv.dB, 0.5 * cnv.dB, 0.23 * cnv.dB)
+        spacecraft = Spacecraft(Antenna(-1.3 * cnv.dB), 0 * cnv.dB, dtransmitter, dtransmitter, 380 * u.km)
+        dlink = Downlink(ground_station, spacecraft, 437 * u.MHz, 30 * u.deg, 3.4 * cnv.dB,
+                         20000, 1e-6, 1 * cnv.dB, 8 * cnv.dB)
+        nominal = dlink.link_margin
+
+        link = dlink.with_parameters({'ground_station.gs_receiver.lna_temperature': [28, 56],
+                                      'ground_station.gs_antenna.antenna_gain': 15 * cnv.dB,
+                                      'freq': 0.437 * u.GHz})
+        self.assertEqual(link.link_margin.shape, (2,))
+        self.assertAlmostEqual(link.link_margin[0].value, nominal.value + 3, 9)
+        self.assertEqual(link.ground_station.gs_receiver.lna_temperature.unit, u.K)
+        # The nominal link and its components are left untouched
+        assert_quantity_allclose(dlink.link_margin, nominal)
+        self.assertIs(link.spacecraft, dlink.spacecraft)
+        self.assertEqual(gs_antenna.antenna_gain, 12 * cnv.dB)
+        self.assertRaises(AttributeError, dlink.with_parameters, {'ground_station.lna_temperature': 28})
+
+        self.assertEqual(dlink.parameter('ground_station.gs_receiver.lna_temperature'), 28 * u.K)
+        self.assertRaises(AttributeError, dlink.parameter, 'ground_station.lna_temperature')
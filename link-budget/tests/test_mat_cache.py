@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import scipy.io
+
+from linkbudget.mat_cache import load_mat, cache_directory
+
+
+class MatCacheTestCases(unittest.TestCase):
+
+    def test_load_mat(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'performance_error.mat')
+            angles = np.arange(12, dtype=float).reshape(6, 2)
+            angles[1, 0] = np.nan
+            scipy.io.savemat(path, {'angles': angles, 'eclipse': np.array([[0, 1, 1, 0]], dtype=np.uint8)})
+
+            data = load_mat(path)
+            self.assertIsInstance(data['angles'], np.memmap)
+            self.assertEqual(data['angles'][1, 0], 0)
+            np.testing.assert_array_equal(data['eclipse'], [[0, 1, 1, 0]])
+            self.assertTrue(os.path.exists(os.path.join(cache_directory(path), 'metadata.json')))
+            with self.assertRaises(ValueError):
+                data['angles'][0, 0] = 1
+
+            # Unchanged files are served from the cache, changed ones are converted again
+            mtime = os.path.getmtime(os.path.join(cache_directory(path), 'angles.npy'))
+            load_mat(path)
+            self.assertEqual(os.path.getmtime(os.path.join(cache_directory(path), 'angles.npy')), mtime)
+            self.assertTrue(np.isnan(load_mat(path, nan=None)['angles'][1, 0]))
+            scipy.io.savemat(path, {'angles': 2 * angles})
+            data = load_mat(path)
+            self.assertEqual(set(data), {'angles'})
+            self.assertEqual(data['angles'][0, 1], 2)
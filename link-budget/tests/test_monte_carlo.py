@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+from astropy import units as u
+from pycraf import conversions as cnv
+
+from helpers import downlink
+from linkbudget.link import Downlink
+from linkbudget.monte_carlo import MonteCarlo, Normal, Uniform, Triangular, exceedance_probability
+from linkbudget.statistics import RunningStatistics
+
+
+class MonteCarloTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.dlink = downlink()
+        self.tolerances = {
+            'mod_loss': Uniform(0.5),
+            'ground_station.gs_receiver.lna_temperature': Normal(10),
+            'spacecraft.sc_transmitter.mismatch_losses': Triangular(0.2),
+        }
+
+    def test_monte_carlo(self):
+        nominal = self.dlink.link_margin.value
+        result = MonteCarlo(self.dlink, {'mod_loss': Normal(1)}, draws=20000, chunk_size=3000, seed=1).run()
+        self.assertEqual(result['link_margin'].shape, (20000,))
+        np.testing.assert_allclose(result['link_margin'], nominal - (result['mod_loss'] - 1))
+        self.assertAlmostEqual(np.std(result['link_margin']), 1, 1)
+
+        # Every draw is the budget of the objects with the drawn values
+        result = MonteCarlo(self.dlink, self.tolerances, draws=50, chunk_size=16, seed=2).run()
+        receiver = self.dlink.ground_station.gs_receiver
+        transmitter = self.dlink.spacecraft.sc_transmitter
+        for i in (0, 17, 49):
+            link = Downlink(self.dlink.ground_station, self.dlink.spacecraft, 437.5 * u.MHz, 20 * u.deg,
+                            4.7 * cnv.dB, 10000, 1e-6, result['mod_loss'][i] * cnv.dB, 7.2 * cnv.dB)
+            receiver.lna_temperature = result['ground_station.gs_receiver.lna_temperature'][i] * u.K
+            transmitter.mismatch_losses = result['spacecraft.sc_transmitter.mismatch_losses'][i] * cnv.dB
+            self.assertAlmostEqual(result['link_margin'][i], link.link_margin.value, 9)
+        receiver.lna_temperature = 28 * u.K
+        transmitter.mismatch_losses = 0.23 * cnv.dB
+        self.assertAlmostEqual(self.dlink.link_margin.value, nominal)
+        self.assertTrue(np.all(np.abs(result['mod_loss'] - 1) <= 0.5))
+
+        self.assertRaises(AttributeError, MonteCarlo, self.dlink, {'ground_station.lna_temperature': Normal(1)})
+
+    def test_monte_carlo_chunks(self):
+        engine = MonteCarlo(self.dlink, self.tolerances, draws=1000, chunk_size=300, seed=3)
+        elev_angle = np.array([10., 30., 60.])
+        result = engine.run(elev_angle)
+        self.assertEqual(result['link_margin'].shape, (1000, 3))
+        np.testing.assert_array_equal(engine.run(elev_angle)['link_margin'], result['link_margin'])
+
+        # Same draws in worker processes
+        engine.max_workers = 2
+        np.testing.assert_array_equal(engine.run(elev_angle)['link_margin'], result['link_margin'])
+
+        statistics = RunningStatistics()
+        engine.max_workers = 1
+        engine.run(sink=lambda chunk: statistics.update(chunk['link_margin']))
+        self.assertEqual(statistics.count, 1000)
+
+        probability = exceedance_probability(result['link_margin'], [0, 15])
+        self.assertEqual(probability.shape, (3, 2))
+        np.testing.assert_allclose(probability[:, 1], np.mean(result['link_margin'] > 15, axis=0))
+        self.assertTrue(np.all(np.diff(probability[:, 1]) >= 0))
+        self.assertEqual(exceedance_probability([1., -1., 2., 3.]), 0.75)
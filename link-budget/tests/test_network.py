@@ -0,0 +1,81 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from helpers import dipole_antenna, downlink, gs_location
+from linkbudget.antenna import AntennaMeasured
+from linkbudget.dynamic import DynamicLink
+from linkbudget.network import GroundStationNetwork
+from linkbudget.stage_cache import StageCache
+
+
+class NetworkTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.stations = self.network_stations(dipole_antenna())
+
+        # Polar pass over Europe
+        n = 400
+        self.ephemeris = {
+            'altitude': np.full(n, 500.),
+            'latitude': np.linspace(0, 85, n),
+            'longitude': np.full(n, 22.),
+        }
+        self.attitude = np.stack([np.linspace(-5, 5, n), np.zeros(n)], axis=-1)
+
+    @staticmethod
+    def network_stations(sc_antenna):
+        stations = {}
+        for name, gain, lon, lat in (('thessaloniki', 12, 22.959887, 40.627233), ('kiruna', 20, 20.96, 67.86),
+                                     ('santiago', 15, -70.67, -33.45)):
+            stations[name] = (downlink(sc_antenna, gain), gs_location(lon, lat))
+        return stations
+
+    def test_network(self):
+        network = GroundStationNetwork(self.stations, chunk_size=64, min_elevation=5)
+        result = network.run(self.ephemeris, self.attitude)
+        self.assertEqual(result['link_margin'].shape, (400, 3))
+
+        # Same as one dynamic link per station
+        for i, (link, location) in enumerate(self.stations.values()):
+            expected = DynamicLink(link, location, min_elevation=5).run(self.ephemeris, self.attitude)
+            for key in ('link_margin', 'pointing_loss', 'gain'):
+                np.testing.assert_allclose(result[key][:, i], expected[key])
+            visible = expected['elev_angle'] >= 5
+            np.testing.assert_allclose(result['elev_angle'][visible, i], expected['elev_angle'][visible])
+        self.assertTrue(np.all(np.isnan(result['link_margin'][:, 2])))
+
+        # Best station of every sample
+        margin = result['link_margin']
+        contact = ~np.all(np.isnan(margin), axis=1)
+        self.assertTrue(np.any(contact) and not np.all(contact))
+        np.testing.assert_array_equal(result['best_station'][~contact], -1)
+        np.testing.assert_allclose(result['best_margin'][contact], np.nanmax(margin[contact], axis=1))
+        both = ~np.isnan(margin[:, 0]) & ~np.isnan(margin[:, 1])
+        self.assertTrue(np.any(both))
+        np.testing.assert_array_equal(result['best_station'][both], np.argmax(margin[both, :2], axis=1))
+
+    def test_network_options(self):
+        # Half-sphere pattern and attitude errors beyond it, as in the UHF script
+        theta = np.linspace(-90, 90, 181)
+        phi = np.linspace(-179, 180, 360)
+        sc_antenna = AntennaMeasured(2 + theta[:, None] / 90 + np.cos(np.deg2rad(phi)), 1, theta, phi)
+        stations = self.network_stations(sc_antenna)
+        attitude = self.attitude.copy()
+        attitude[::2, 0] = 120
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = StageCache(directory)
+            network = GroundStationNetwork(stations, chunk_size=64, min_elevation=5, cache=cache, fold_theta=True)
+            result = network.run(self.ephemeris, attitude)
+            self.assertGreater(cache.misses, 0)
+            self.assertEqual(cache.hits, 0)
+            cached = network.run(self.ephemeris, attitude)
+            self.assertEqual(cache.hits, cache.misses)
+
+        for i, (link, location) in enumerate(stations.values()):
+            expected = DynamicLink(link, location, min_elevation=5, fold_theta=True).run(self.ephemeris, attitude)
+            for key in ('link_margin', 'pointing_loss', 'gain'):
+                np.testing.assert_allclose(result[key][:, i], expected[key])
+                np.testing.assert_array_equal(cached[key][:, i], result[key][:, i])
@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from linkbudget.passes import find_passes
+
+
+class PassesTestCases(unittest.TestCase):
+
+    def test_find_passes(self):
+        elev_angle = np.array([5., 2., -1., -10., -2., 4., 30., 12., -3., -20., 1.])
+        passes = find_passes(elev_angle)
+        np.testing.assert_array_equal(passes['aos'], [0, 5, 10])
+        np.testing.assert_array_equal(passes['los'], [2, 8, 11])
+        np.testing.assert_array_equal(passes['max_elevation'], [5, 30, 1])
+
+        passes = find_passes(elev_angle, min_elevation=10, time=10 * np.arange(11))
+        np.testing.assert_array_equal(passes['aos'], [6])
+        np.testing.assert_array_equal(passes['los'], [8])
+        np.testing.assert_allclose(passes['aos_time'], [50 + 10 * 6 / 26])
+        np.testing.assert_allclose(passes['los_time'], [70 + 10 * 2 / 15])
+
+        passes = find_passes(np.arange(4.), 0, np.arange(4.))
+        np.testing.assert_array_equal(passes['aos_time'], [0])
+        np.testing.assert_array_equal(passes['los_time'], [3])
+
+        passes = find_passes(-np.ones(5))
+        self.assertEqual(len(passes['aos']), 0)
+        self.assertEqual(len(passes['max_elevation']), 0)
+
+        for elev_angle in (np.empty(0), -np.ones(5)):
+            passes = find_passes(elev_angle, time=np.arange(len(elev_angle)))
+            self.assertEqual(len(passes['aos']), 0)
+            self.assertEqual(len(passes['aos_time']), 0)
+            self.assertEqual(len(passes['los_time']), 0)
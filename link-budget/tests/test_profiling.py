@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from helpers import dipole_antenna, downlink, gs_location, pass_ephemeris
+from linkbudget import profiling
+from linkbudget.dynamic import DynamicLink
+from linkbudget.ephemeris import read_gmat_report
+from linkbudget.profiling import Profiler, stage
+
+REPORT = os.path.join(os.path.dirname(__file__), 'gmatReport.txt')
+
+
+class ProfilingTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.dlink = downlink(dipole_antenna())
+        self.gs_coo = gs_location()
+        self.ephemeris = pass_ephemeris()
+
+    def test_disabled(self):
+        self.assertIsNone(profiling._active)
+        with stage('x', 10) as s:
+            s.samples = 5
+        with Profiler() as profile:
+            pass
+        DynamicLink(self.dlink, self.gs_coo).run(self.ephemeris)
+        self.assertEqual(profile.events, [])
+
+    def test_dynamic_link(self):
+        with Profiler() as profile:
+            read_gmat_report(REPORT)
+            DynamicLink(self.dlink, self.gs_coo, chunk_size=20, min_elevation=10).run(self.ephemeris)
+        self.assertIsNone(profiling._active)
+
+        summary = profile.summary()
+        self.assertEqual(list(summary), ['ephemeris', 'geometry', 'attitude', 'gain', 'margin', 'chunk'])
+        self.assertEqual(summary['ephemeris']['samples'], 5)
+        self.assertEqual((summary['chunk']['calls'], summary['chunk']['samples']), (3, 50))
+        self.assertEqual(summary['geometry']['samples'], 50)
+        # Only the visible samples go through the later stages
+        visible = summary['gain']['samples']
+        self.assertTrue(0 < visible < 50)
+        self.assertEqual(summary['margin']['samples'], visible)
+
+        # The stages of a chunk are nested in it
+        for event in profile.events:
+            self.assertEqual(event['depth'], 0 if event['name'] in ('ephemeris', 'chunk') else 1)
+            self.assertGreaterEqual(event['duration'], 0)
+        chunk = next(event for event in profile.events if event['name'] == 'chunk')
+        geometry = next(event for event in profile.events if event['name'] == 'geometry')
+        self.assertLessEqual(chunk['start'], geometry['start'])
+        self.assertLessEqual(geometry['start'] + geometry['duration'], chunk['start'] + chunk['duration'])
+
+    def test_nested(self):
+        outer, inner = Profiler(), Profiler(memory=True)
+        outer.start()
+        inner.start()
+        self.assertRaises(RuntimeError, outer.stop)
+        self.assertIs(profiling._active, inner)
+        inner.stop()
+        self.assertIs(profiling._active, outer)
+        outer.stop()
+        self.assertIsNone(profiling._active)
+        outer.stop()
+
+        with Profiler() as profile:
+            with stage('x', 10):
+                pass
+        # A stage too short for the clock has no rate, rather than a NaN that isn't valid JSON
+        profile.events[0]['duration'] = 0.
+        self.assertIsNone(profile.summary()['x']['rate'])
+
+    def test_memory(self):
+        with Profiler(memory=True) as profile:
+            with stage('outer'):
+                with stage('inner', 1000):
+                    a = np.ones(1000000)
+                del a
+        inner, outer = profile.events
+        self.assertEqual((inner['name'], outer['name']), ('inner', 'outer'))
+        self.assertGreaterEqual(inner['memory'], 8000000)
+        self.assertGreaterEqual(outer['peak'], 8000000)
+        self.assertLess(outer['memory'], 8000000)
+
+    def test_export(self):
+        with Profiler() as profile:
+            DynamicLink(self.dlink, self.gs_coo).run(self.ephemeris)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.json')
+            profile.to_json(path)
+            with open(path) as f:
+                report = json.load(f)
+            self.assertEqual(report['summary']['margin']['samples'], 50)
+            self.assertEqual(len(report['events']), 5)
+
+            path = os.path.join(directory, 'trace.json')
+            profile.to_chrome_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+            self.assertEqual([event['name'] for event in trace['traceEvents']],
+                             ['geometry', 'attitude', 'gain', 'margin', 'chunk'])
+            for event in trace['traceEvents']:
+                self.assertEqual(event['ph'], 'X')
+                self.assertEqual(event['args']['samples'], 50)
@@ -0,0 +1,136 @@
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+from astropy import units as u
+
+from helpers import dipole_antenna, downlink, gs_location, pass_attitude, pass_ephemeris
+from linkbudget.dynamic import DynamicLink
+from linkbudget.ephemeris import read_gmat_report
+from linkbudget.stage_cache import StageCache, content_hash
+
+REPORT = os.path.join(os.path.dirname(__file__), 'gmatReport.txt')
+
+
+class StageCacheTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        self.sc_antenna = dipole_antenna()
+        self.dlink = downlink(self.sc_antenna)
+        self.gs_coo = gs_location()
+        self.ephemeris = pass_ephemeris()
+        self.attitude = pass_attitude()
+
+    def test_content_hash(self):
+        a = np.arange(10.)
+        self.assertEqual(content_hash('x', a, 1 * u.km), content_hash('x', a.copy(), 1 * u.km))
+        self.assertNotEqual(content_hash(a), content_hash(a.astype(np.float32)))
+        self.assertNotEqual(content_hash(1 * u.km), content_hash(1 * u.m))
+        self.assertNotEqual(content_hash([1, 2]), content_hash([[1, 2]]))
+        self.assertEqual(content_hash({'a': 1, 'b': 2}), content_hash({'b': 2, 'a': 1}))
+
+        # Lazily computed values don't change the hash of a component
+        key = content_hash(self.sc_antenna)
+        self.sc_antenna.gain_p(10, 20)
+        self.assertEqual(content_hash(self.sc_antenna), key)
+        key = content_hash(self.dlink)
+        self.dlink.ground_station.gs_receiver.sky_temperature = 200 * u.K
+        self.assertNotEqual(content_hash(self.dlink), key)
+
+        self.assertRaises(TypeError, content_hash, lambda: 0)
+
+    def test_get_or_compute(self):
+        cache = StageCache(self.tmp.name)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return {'x': np.arange(5.), 'epoch': np.array(['2000-01-01T00:00'], dtype='datetime64[ms]')}
+
+        key = cache.key('stage', np.arange(3))
+        first = cache.get_or_compute(key, compute)
+        second = cache.get_or_compute(key, compute)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        for name in first:
+            np.testing.assert_array_equal(second[name], first[name])
+            self.assertEqual(second[name].dtype, first[name].dtype)
+        self.assertIsNone(cache.get(cache.key('stage', np.arange(4))))
+
+        cache.clear()
+        self.assertEqual(cache.size, 0)
+
+    def test_corrupt_entry(self):
+        cache = StageCache(self.tmp.name)
+        key = cache.key('stage')
+        cache.put(key, {'x': np.arange(5.)})
+        with open(os.path.join(self.tmp.name, key + '.npz'), 'r+b') as f:
+            f.truncate(10)
+
+        # A corrupt entry is a miss, computed and stored again
+        arrays = cache.get_or_compute(key, lambda: {'x': np.arange(5.)})
+        np.testing.assert_array_equal(arrays['x'], np.arange(5.))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        np.testing.assert_array_equal(cache.get(key)['x'], np.arange(5.))
+
+    def test_evict(self):
+        cache = StageCache(self.tmp.name)
+        for i in range(3):
+            cache.put(str(i), {'x': np.zeros(1000)})
+            # Distinct modification times
+            time.sleep(0.01)
+        entry = cache.size // 3
+
+        # Using an entry makes it the most recently used one
+        cache.get('0')
+        cache.max_bytes = 2 * entry
+        cache.evict()
+        self.assertIsNone(cache.get('1'))
+        self.assertIsNotNone(cache.get('0'))
+        time.sleep(0.01)
+        self.assertIsNotNone(cache.get('2'))
+        self.assertEqual(cache.size, 2 * entry)
+
+        # Puts only evict once they push the cache over max_bytes
+        cache.max_bytes = 3 * entry
+        time.sleep(0.01)
+        cache.put('3', {'x': np.zeros(1000)})
+        self.assertEqual(cache.size, 3 * entry)
+        time.sleep(0.01)
+        cache.put('4', {'x': np.zeros(1000)})
+        self.assertIsNone(cache.get('0'))
+        self.assertEqual(cache.size, 3 * entry)
+
+    def test_dynamic_link(self):
+        cache = StageCache(self.tmp.name)
+        expected = DynamicLink(self.dlink, self.gs_coo, min_elevation=10).run(self.ephemeris, self.attitude)
+        link = DynamicLink(self.dlink, self.gs_coo, chunk_size=20, min_elevation=10, cache=cache)
+        for _ in range(2):
+            result = link.run(self.ephemeris, self.attitude)
+            for key in expected:
+                np.testing.assert_array_equal(result[key], expected[key])
+        # 3 chunks x 3 stages, all computed once then loaded
+        self.assertEqual((cache.hits, cache.misses), (9, 9))
+
+        # Only the margin stage depends on the receiver
+        self.dlink.ground_station.gs_receiver.sky_temperature = 200 * u.K
+        expected = DynamicLink(self.dlink, self.gs_coo, min_elevation=10).run(self.ephemeris, self.attitude)
+        result = link.run(self.ephemeris, self.attitude)
+        self.assertEqual((cache.hits, cache.misses), (15, 12))
+        np.testing.assert_array_equal(result['link_margin'], expected['link_margin'])
+
+    def test_read_gmat_report(self):
+        cache = StageCache(self.tmp.name)
+        expected = read_gmat_report(REPORT)
+        for _ in range(2):
+            report = read_gmat_report(REPORT, cache=cache)
+            self.assertEqual(list(report), list(expected))
+            for key in expected:
+                np.testing.assert_array_equal(report[key], expected[key])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(list(read_gmat_report(REPORT, ['latitude'], cache=cache)), ['latitude'])
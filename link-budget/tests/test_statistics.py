@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from linkbudget.statistics import RunningStatistics, LinkStatistics
+
+
+class StatisticsTestCases(unittest.TestCase):
+
+    def test_running_statistics(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(5, 3, 100000)
+        values[::97] = np.nan
+        valid = values[~np.isnan(values)]
+
+        statistics = RunningStatistics([0, 3], low=-20, high=30, bins=5000)
+        for chunk in np.array_split(values, 13):
+            statistics.update(chunk)
+        self.assertEqual(statistics.count, valid.size)
+        self.assertAlmostEqual(statistics.mean, valid.mean(), 10)
+        self.assertAlmostEqual(statistics.variance, valid.var(), 8)
+        self.assertEqual((statistics.minimum, statistics.maximum), (valid.min(), valid.max()))
+        np.testing.assert_allclose(statistics.percentile([1, 50, 99]), np.percentile(valid, [1, 50, 99]), atol=0.01)
+        np.testing.assert_allclose(statistics.percentile([0, 100]), [valid.min(), valid.max()])
+        self.assertAlmostEqual(statistics.fraction_above(3), np.mean(valid > 3))
+        self.assertAlmostEqual(statistics.fraction_below(0), np.mean(valid < 0))
+        self.assertRaises(KeyError, statistics.fraction_above, 1)
+
+        # Merging two halves gives the statistics of the whole
+        first, second = RunningStatistics([0, 3], -20, 30, 5000), RunningStatistics([0, 3], -20, 30, 5000)
+        first.update(values[:30000])
+        second.update(values[30000:])
+        first.merge(second)
+        self.assertAlmostEqual(first.variance, statistics.variance, 8)
+        np.testing.assert_array_equal(first.histogram, statistics.histogram)
+        self.assertRaises(ValueError, first.merge, RunningStatistics())
+        self.assertTrue(np.isnan(RunningStatistics().percentile(50)))
+
+    def test_link_statistics(self):
+        margin = np.full(100, np.nan)
+        margin[10:30] = np.linspace(5, -1, 20)
+        margin[45:70] = np.linspace(8, 2, 25)
+        margin[90:] = 4
+        loss = np.where(np.isnan(margin), np.nan, 1.)
+        loss[50:55] = 4
+
+        statistics = LinkStatistics(step=0.1, thresholds={'link_margin': [0], 'pointing_loss': [3]})
+        for start in range(0, 100, 16):
+            statistics({'link_margin': margin[start:start + 16], 'pointing_loss': loss[start:start + 16]})
+        self.assertEqual(statistics.samples, 100)
+        passes = statistics.passes
+        np.testing.assert_array_equal(passes['aos'], [10, 45, 90])
+        np.testing.assert_array_equal(passes['los'], [30, 70, 100])
+        np.testing.assert_allclose(passes['min_margin'], [-1, 2, 4])
+        self.assertAlmostEqual(statistics.time_above('pointing_loss', 3), 0.5)
+        self.assertAlmostEqual(statistics.time_below('link_margin', 0), 0.1 * np.sum(margin < 0))
+        self.assertAlmostEqual(statistics.quantities['link_margin'].mean, np.nanmean(margin))
+
+        # Passes from the elevation mask instead
+        elev_angle = np.where(np.isnan(margin), -10., 20.)
+        statistics = LinkStatistics(min_elevation=10)
+        statistics({'elev_angle': elev_angle, 'link_margin': margin})
+        np.testing.assert_array_equal(statistics.passes['aos'], [10, 45, 90])
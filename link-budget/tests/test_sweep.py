@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from helpers import downlink, gs_location, pass_attitude, pass_ephemeris
+from linkbudget.antenna import AntennaMeasured
+from linkbudget.dynamic import DynamicLink
+from linkbudget.sweep import Scenario, ScenarioSweep
+
+
+def min_margin(result):
+    return result['link_margin'].min()
+
+
+class SweepTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.scenarios = []
+        for gs_gain in [12, 14, 16, 18]:
+            ephemeris = {
+                'altitude': np.full(100, 500.),
+                'latitude': np.linspace(30, 50, 100),
+                'longitude': np.linspace(15, 30, 100),
+            }
+            self.scenarios.append(Scenario('gs{}'.format(gs_gain), downlink(gs_gain=gs_gain), gs_location(),
+                                           ephemeris, reduce=min_margin))
+
+    def test_scenario_sweep(self):
+        results = dict(ScenarioSweep(self.scenarios, max_workers=2).run())
+        self.assertEqual(set(results), {'gs12', 'gs14', 'gs16', 'gs18'})
+        for scenario in self.scenarios:
+            self.assertAlmostEqual(results[scenario.name], scenario.run())
+        self.assertAlmostEqual(results['gs14'] - results['gs12'], 2)
+
+    def test_scenario_dynamic_options(self):
+        # Half-sphere pattern and attitude errors beyond it, as in the UHF script
+        theta = np.linspace(-90, 90, 181)
+        phi = np.linspace(-179, 180, 360)
+        dlink = downlink(AntennaMeasured(2 + theta[:, None] / 90 + np.cos(np.deg2rad(phi)), 1, theta, phi))
+        attitude = pass_attitude()
+        attitude[::2, 0] = 60
+        options = {'min_elevation': 10, 'fold_theta': True}
+        expected = DynamicLink(dlink, gs_location(), **options).run(pass_ephemeris(), attitude)
+
+        scenario = Scenario('uhf', dlink, gs_location(), pass_ephemeris(), attitude, dynamic_options=options)
+        (name, result), = ScenarioSweep([scenario], max_workers=1).run()
+        self.assertEqual(name, 'uhf')
+        for key in expected:
+            np.testing.assert_array_equal(result[key], expected[key])
+        self.assertTrue(np.isnan(result['link_margin']).any())
+        unfolded = DynamicLink(dlink, gs_location(), min_elevation=10).run(pass_ephemeris(), attitude)
+        self.assertFalse(np.allclose(np.nan_to_num(unfolded['gain']), np.nan_to_num(result['gain'])))
+
+    def test_scenario_sweep_cancel(self):
+        sweep = ScenarioSweep(self.scenarios * 4, max_workers=1)
+        results = []
+        for result in sweep.run():
+            results.append(result)
+            sweep.cancel()
+        self.assertTrue(sweep.cancelled)
+        self.assertEqual(len(results), 1)
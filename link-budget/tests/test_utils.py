@@ -1,9 +1,11 @@
 import unittest
 
+import numpy as np
 from astropy import units as u
+from astropy.coordinates import EarthLocation
 from astropy.tests.helper import assert_quantity_allclose
 
-from linkbudget.utils import slant_range
+from linkbudget.utils import slant_range, elevation_angle, geodetic_to_ecef, ecef_to_geodetic, as_earth_location
 
 
 class UtilsTestCases(unittest.TestCase):
@@ -11,3 +13,42 @@ class UtilsTestCases(unittest.TestCase):
     def test_slant_range(self):
         d = slant_range(380 * u.km, 50 * u.m, 30 * u.deg)
         assert_quantity_allclose(d, 704.68 * u.km, rtol=1e-2)
+
+    def test_elevation_angle(self):
+        gs = EarthLocation.from_geodetic(22.959887, 40.627233, 56 * u.m)
+        zenith = EarthLocation.from_geodetic(22.959887, 40.627233, 500 * u.km)
+        assert_quantity_allclose(elevation_angle(zenith, gs), 90 * u.deg, atol=1e-6 * u.deg)
+
+        sat = EarthLocation.from_geodetic([0, 20, 22, 60, -150], [0, 35, 45, 40, -30], [500, 500, 600, 500, 500] * u.km)
+        elev, visible = elevation_angle(sat, gs, visibility=True)
+        self.assertEqual(elev.shape, (5,))
+        for i in range(5):
+            assert_quantity_allclose(elev[i], elevation_angle(sat[i], gs))
+        np.testing.assert_array_equal(visible, elev > 0 * u.deg)
+        self.assertFalse(visible[-1])
+
+        # Plain N x 3 ECEF arrays (in m)
+        cart = np.stack([sat.x.to_value(u.m), sat.y.to_value(u.m), sat.z.to_value(u.m)], axis=-1)
+        assert_quantity_allclose(elevation_angle(cart, gs), elev)
+
+    def test_geodetic_to_ecef(self):
+        rng = np.random.default_rng(0)
+        longitude, latitude = rng.uniform(-180, 180, 1000), rng.uniform(-90, 90, 1000)
+        height = rng.uniform(-100, 4e7, 1000)
+        position = geodetic_to_ecef(longitude, latitude, height)
+        self.assertEqual(position.shape, (1000, 3))
+
+        # Same as astropy, which is only an adapter
+        location = EarthLocation.from_geodetic(longitude, latitude, height)
+        np.testing.assert_allclose(position[:, 0], location.x.to_value(u.m), atol=1e-6)
+        np.testing.assert_allclose(position[:, 2], location.z.to_value(u.m), atol=1e-6)
+        np.testing.assert_allclose(geodetic_to_ecef(longitude * u.deg, latitude * u.deg, height / 1000 * u.km),
+                                   position, atol=1e-6)
+        np.testing.assert_allclose(geodetic_to_ecef(0, 90), [0, 0, 6356752.314245], atol=1e-6)
+
+        lon, lat, h = ecef_to_geodetic(position)
+        np.testing.assert_allclose(lon, longitude, atol=1e-10)
+        np.testing.assert_allclose(lat, latitude, atol=1e-10)
+        np.testing.assert_allclose(h, height, atol=1e-6)
+        np.testing.assert_allclose(ecef_to_geodetic(location)[2], height, atol=1e-6)
+        np.testing.assert_allclose(as_earth_location(position).y.to_value(u.m), position[:, 1])